@@ -0,0 +1,49 @@
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # PIL is imported by backends when they grab
+    from PIL import Image
+
+Bbox = tuple[int, int, int, int]  # (left, top, right, bottom)
+
+
+class Backend:
+    """Mouse input and screen capture used by Board"""
+
+    def move_to(self, x: float, y: float, duration: float = 0.0):
+        raise NotImplementedError
+
+    def mouse_down(self, x: float | None = None, y: float | None = None):
+        raise NotImplementedError
+
+    def mouse_up(self):
+        raise NotImplementedError
+
+    def grab(self, bbox: Bbox | None = None) -> "Image.Image":
+        raise NotImplementedError
+
+    def sleep(self, secs: float):
+        time.sleep(secs)
+
+
+class DesktopBackend(Backend):
+    """Real desktop, driven by pyautogui and captured by ImageGrab"""
+
+    def __init__(self):
+        import pyautogui
+        from PIL import ImageGrab
+
+        self.pyautogui = pyautogui
+        self.image_grab = ImageGrab
+
+    def move_to(self, x: float, y: float, duration: float = 0.0):
+        self.pyautogui.moveTo(x, y, duration=duration)
+
+    def mouse_down(self, x: float | None = None, y: float | None = None):
+        self.pyautogui.mouseDown(x, y, button="left")
+
+    def mouse_up(self):
+        self.pyautogui.mouseUp(button="left")
+
+    def grab(self, bbox: Bbox | None = None) -> "Image.Image":
+        return self.image_grab.grab(bbox)
@@ -1,17 +1,30 @@
 import os
+import queue
 import time
 from collections.abc import Callable
-from statistics import mean, stdev
+from threading import Thread
+from typing import TYPE_CHECKING
 
-import pyautogui
-from PIL import Image, ImageGrab
-
-from Card import Card
+from Backend import Backend, DesktopBackend
+from Budget import CancelToken, SolveBudget
+from Card import Card, CardBitmap
 from Game import Game
+from Metrics import GameMetrics, PlayMetrics
+from Move import Move
 from Rank import Rank
 from Stack import Stack
 
+if TYPE_CHECKING:  # optional parts, imported where they are set up
+    from Daemon import SolverClient
+    from Geometry import Geometry, GeometryCache
+    from OutOfCore import OutOfCore
+    from Predictor import Predictor
+    from Session import DealCapture, SessionRecorder
+
 CARD_IMAGES = r"res/"
+ENDGAME_TABLE = r"endgame.bin"  # built by Endgame.py, used when present
+DAEMON_SOCKET = r"solver.sock"  # where Daemon.py listens by default, used when present
+GEOMETRY_CACHE = r"geometry.json"  # geometry per window size, used when present
 
 
 class Board:
@@ -26,6 +39,7 @@ class Board:
 
     left_offset = 369
     top_offset = 465
+    square_offset = (3, 5)  # recognition square from the top left of a card
 
     card_width = 112
     card_height = 15
@@ -36,49 +50,160 @@ class Board:
     newgame_x = 1400
     newgame_y = 900
 
+    # give up a deal and deal next one when solving exceeds these, None = no limit
+    solve_seconds: float | None = 30.0
+    solve_nodes: int | None = None
+    # play committed moves while solving, see Game.solve(on_prefix=...)
+    anytime = False
+    # solve in stages, faster on hard deals but not shortest, see Game.solve_by_goals
+    decompose = False
+    # keep the search frontier on disk, for deals too big for RAM
+    out_of_core: "OutOfCore | None" = None
+    # check deals before solving, hopeless ones are solved with hand ("hand")
+    # or dealt again ("skip"), in hand mode too
+    predictor: "Predictor | None" = None
+    hopeless_policy = "hand"
+    # log deals, their pixels, moves and timings for Session.replay
+    recorder: "SessionRecorder | None" = None
+    # solve in a shared Daemon.py process, used when its socket is present
+    daemon: "SolverClient | None" = None
+
     values = ["H", "0", "9", "8", "7", "6"]
     suits = ["H", "D", "C", "S", "R", "B"]
 
-    def __init__(self):
+    def __init__(self, backend: Backend | None = None):
+        self.backend = backend if backend is not None else DesktopBackend()
         self.starting_rows = 4
         self.starting_cols = 9
 
         self.game = None
+        self.metrics = PlayMetrics()
+        self.token = CancelToken()  # cancel() stops play_games asap
+        self.player: Thread | None = None  # plays moves in anytime mode
+        self.deal_capture: "DealCapture | None" = None  # pixels of the deal, recorder
+
+        if Game.endgame is None and os.path.exists(ENDGAME_TABLE):
+            from Endgame import EndgameTable
+
+            Game.endgame = EndgameTable.load(ENDGAME_TABLE)
+        if self.daemon is None and os.path.exists(DAEMON_SOCKET):
+            from Daemon import SolverClient
 
+            self.daemon = SolverClient(DAEMON_SOCKET)
+        # the real screen only, a backend passed in draws the class geometry;
+        # applied on the first make_game, when the screen size is known
+        self.geometry_cache: "GeometryCache | None" = None
+        if backend is None and os.path.exists(GEOMETRY_CACHE):
+            from Geometry import GeometryCache
+
+            self.geometry_cache = GeometryCache(GEOMETRY_CACHE)
+
+        self.set_boxes(self.left_offset, self.top_offset)
+
+    def set_boxes(self, left: int, top: int):
+        """Recognition squares of every card, the first one at (left, top)"""
         self.bounding_box_list = []
         for c in range(self.starting_cols):
             self.bounding_box_list.append([])
             for r in range(self.starting_rows):
                 new_bounding_box = (
-                    self.left_offset + self.horizontal_spacing * c,
-                    self.top_offset + self.vertical_spacing * r,
-                    self.left_offset + self.horizontal_spacing * c + self.square_size,
-                    self.top_offset + self.vertical_spacing * r + self.square_size,
+                    left + self.horizontal_spacing * c,
+                    top + self.vertical_spacing * r,
+                    left + self.horizontal_spacing * c + self.square_size,
+                    top + self.vertical_spacing * r + self.square_size,
                 )
                 self.bounding_box_list[c].append(new_bounding_box)
 
+    def apply_geometry(self, geometry: "Geometry", size: tuple[int, int]):
+        """Play on geometry of a window of size at the screen origin.
+
+        Offsets are set like Gui.update_board does, the recognition squares
+        keep square_offset into the cards.
+        """
+        sx, sy = size[0] / 1920, size[1] / 1080
+        left, top, right, bottom = geometry.desk
+        card_width, card_height = geometry.card_size
+        cols, rows = self.starting_cols, self.starting_rows
+
+        self.left_offset = int(left * sx)
+        self.top_offset = int(top * sy)
+        self.card_width = int(card_width * sx)
+        self.horizontal_spacing = int((right - left - card_width) / (cols - 1) * sx)
+        self.vertical_spacing = int((bottom - top - card_height) / (rows - 1) * sy)
+        self.hand_x = int(geometry.hand[0] * sx)
+        self.hand_y = int(geometry.hand[1] * sy)
+        self.newgame_x = int(geometry.newgame[0] * sx)
+        self.newgame_y = int(geometry.newgame[1] * sy)
+
+        self.square_size = round(Board.square_size * sx)
+        self.set_boxes(
+            self.left_offset + round(self.square_offset[0] * sx),
+            self.top_offset + round(self.square_offset[1] * sy),
+        )
+
+    def calibrate(self):
+        """Apply the geometry cached for the screen size, detected on this
+        grab when missing, once"""
+        from Geometry import GeometryDetector
+
+        cache, self.geometry_cache = self.geometry_cache, None
+        if cache is None:
+            return
+        image = self.backend.grab()
+        try:
+            geometry = cache.lookup(image, GeometryDetector(self.starting_cols))
+        except ValueError as e:
+            print(f"geometry not detected, using defaults: {e}")
+            return
+        self.apply_geometry(geometry, image.size)
+
+    templates: list[tuple[str, list]] | None = None  # (name, pixels) under res/
+
+    @classmethod
+    def load_templates(cls):
+        if cls.templates is None:
+            from PIL import Image  # only the res/ templates need it
+
+            cls.templates = []
+            for image_os in os.listdir(CARD_IMAGES):
+                image_name = os.fsdecode(image_os)
+                image = Image.open(CARD_IMAGES + image_os).convert("RGB")
+                cls.templates.append((image_name, list(image.getdata())))  # pyright: ignore[reportArgumentType]
+        return cls.templates
+
     @staticmethod
     def get_card(capture):
-        dir = os.listdir(CARD_IMAGES)
-        for image_os in dir:
-            image_name = os.fsdecode(image_os)
-            image = Image.open(CARD_IMAGES + image_os).convert("RGB")
-            if list(image.getdata()) == list(capture.getdata()):  # pyright: ignore[reportArgumentType]
+        data = list(capture.getdata())
+        for image_name, image_data in __class__.load_templates():
+            if image_data == data:
                 card_value = image_name[0]
                 card_suit = image_name[1]
                 return Card(card_value, card_suit)
+        # no exact template, fallback to pattern-based recognition
+        if capture.width == capture.height and capture.width >= 12:
+            is_red, name, _ = CardBitmap.recognize(capture, capture.width)
+            return Card.from_face(is_red, name)
         return Card("?", "?")
 
-    @staticmethod
-    def make_game_by_boxes(rank_boxes):
-        ranks: list[Rank] = []
-        for rank_idx in range(len(rank_boxes)):
-            cards: list[Card] = []
-            for card_box in rank_boxes[rank_idx]:
-                capture = ImageGrab.grab(card_box).convert("RGB")
-                card = __class__.get_card(capture)
-                cards.append(card)
-            ranks.append(Rank(rank_idx, Stack.from_cards(cards)))
+    def make_game_by_boxes(self, rank_boxes):
+        game_metrics = self.metrics.current or GameMetrics(-1)
+        with game_metrics.stage("capture"):
+            captures = [
+                [self.backend.grab(card_box).convert("RGB") for card_box in boxes]
+                for boxes in rank_boxes
+            ]
+        if self.recorder is not None:
+            from Session import DealCapture
+
+            self.deal_capture = DealCapture.from_crops(captures)
+        with game_metrics.stage("recognition"):
+            ranks: list[Rank] = []
+            for rank_idx in range(len(captures)):
+                cards: list[Card] = []
+                for capture in captures[rank_idx]:
+                    card = __class__.get_card(capture)
+                    cards.append(card)
+                ranks.append(Rank(rank_idx, Stack.from_cards(cards)))
         return Game(ranks)
 
     def execute_move_list(self, move_list):
@@ -87,14 +212,14 @@ class Board:
             from_position = self.get_back_stack_position(move.from_rank_id)
             dest_position = self.get_front_stack_position(move.dest_rank_id)
 
-            pyautogui.moveTo(
+            self.backend.move_to(
                 from_position[0], from_position[1], duration=self.default_delay
             )
-            pyautogui.mouseDown(button="left")
-            pyautogui.moveTo(
+            self.backend.mouse_down()
+            self.backend.move_to(
                 dest_position[0], dest_position[1], duration=self.default_delay
             )
-            pyautogui.mouseUp(button="left")
+            self.backend.mouse_up()
 
             self.game.make_move(move)
 
@@ -139,12 +264,13 @@ class Board:
             return (self.get_rank_x(rank_idx), self.get_stack_front_y(rank_idx))
 
     def tab_in(self):
-        pyautogui.mouseDown(self.left_offset - 10, self.top_offset - 10, button="left")
-        time.sleep(self.default_delay)
-        pyautogui.mouseUp()
-        time.sleep(self.default_delay)
+        self.backend.mouse_down(self.left_offset - 10, self.top_offset - 10)
+        self.backend.sleep(self.default_delay)
+        self.backend.mouse_up()
+        self.backend.sleep(self.default_delay)
 
     def make_game(self):
+        self.calibrate()
         return self.make_game_by_boxes(self.bounding_box_list)
 
     def next_game(
@@ -153,74 +279,147 @@ class Board:
         r = on_complete(comp) if on_complete is not None else False
         if not r and comp < n:
             self.tab_in()
-            pyautogui.moveTo(self.newgame_x, self.newgame_y, self.default_delay)
-            pyautogui.mouseDown(button="left")
-            pyautogui.mouseUp(button="left")
-            time.sleep(5)
+            self.backend.move_to(self.newgame_x, self.newgame_y, self.default_delay)
+            self.backend.mouse_down()
+            self.backend.mouse_up()
+            self.backend.sleep(5)
         return r
 
-    def play_games(
+    def run_games(
         self,
         n: int,
+        with_hand: bool,
         game_maker: Callable[[], Game] | None,
         on_complete: Callable[[int], bool] | None,
     ):
-        durations = []
+        """play until n games are solved, stage timings go to self.metrics"""
+        self.metrics.reset()
         completed_games = 0
 
         while completed_games < n:
+            game_metrics = self.metrics.begin()
             if game_maker is None:
                 self.game = self.make_game()
             else:
+                # game_maker may record its capture and recognition stages,
+                # without the latter the rest of its time is recognition
+                start_time = time.perf_counter()
                 self.game = game_maker()
-            start_time = time.time()
-            winning_moves = self.game.solve(True)
-            end_time = time.time()
-
-            if winning_moves is None:
-                if self.next_game(n, completed_games, on_complete):
-                    break
-                continue
-
-            durations.append(end_time - start_time)
-            self.execute_move_list(winning_moves)
-            completed_games += 1
-            if self.next_game(n, completed_games, on_complete):
+                elapsed = time.perf_counter() - start_time
+                if game_metrics.recognition == 0.0:
+                    game_metrics.recognition = elapsed - game_metrics.capture
+            if self.recorder is not None:
+                with game_metrics.stage("record"):
+                    self.recorder.deal(self.game, with_hand, self.deal_capture)
+                self.deal_capture = None
+
+            with game_metrics.stage("solve"):
+                solver, played, winning_moves = self.solve_game(with_hand, game_metrics)
+            game_metrics.nodes = solver.nodes
+            game_metrics.aborted = solver.aborted or ""
+            game_metrics.prefix = len(played)
+
+            with game_metrics.stage("execution"):
+                if self.player is not None:
+                    self.player.join()
+                    self.player = None
+                if winning_moves is not None and len(winning_moves) > 0:
+                    self.execute_move_list(winning_moves)
+            if winning_moves is not None:
+                game_metrics.solved = True
+                game_metrics.moves = len(played) + len(winning_moves)
+                completed_games += 1
+            if self.recorder is not None:
+                moves = None if winning_moves is None else played + winning_moves
+                with game_metrics.stage("record"):
+                    self.recorder.result(moves, game_metrics)
+
+            if self.token.cancelled:
+                break
+            with game_metrics.stage("newgame"):
+                stop = self.next_game(n, completed_games, on_complete)
+            if stop:
                 break
 
-        dur_mean = mean(durations) if len(durations) > 0 else 0.0
-        dur_std = stdev(durations) if len(durations) > 1 else 0.0
-        print(f"{dur_mean:0.3f}s +/- {dur_std}s")
+        print(self.metrics.summary())
+
+    def solve_game(self, with_hand: bool, game_metrics: GameMetrics):
+        """Solve self.game, return (solver, played moves, moves still to play)"""
+        plan = None
+        if self.predictor is not None:
+            prediction = self.predictor.predict(self.game, with_hand)
+            game_metrics.predicted = prediction.verdict
+            plan = prediction.moves
+            if prediction.hopeless:
+                if self.hopeless_policy == "skip":
+                    return self.game, [], None
+                with_hand = True  # likely unsolvable without hand, try it at once
+        game_metrics.hand = with_hand
+
+        budget = SolveBudget(self.solve_seconds, self.solve_nodes, self.token)
+        if self.anytime:
+            return self.solve_anytime(with_hand, budget, plan)
+        if self.decompose:
+            return self.game, [], self.game.solve_by_goals(with_hand, budget)
+        if self.out_of_core is not None:
+            return self.game, [], self.out_of_core.solve(self.game, with_hand, budget)
+        if self.daemon is not None:
+            try:
+                return self.game, [], self.daemon.solve(self.game, with_hand, budget)
+            except OSError as e:
+                print(f"solver daemon unavailable, solving here: {e}")
+                self.daemon = None
+        return self.game, [], self.game.solve(with_hand, budget)
+
+    def solve_anytime(
+        self, with_hand: bool, budget: SolveBudget, plan: list[Move] | None = None
+    ):
+        """Solve a copy of self.game while committed moves are played.
+
+        plan is a solution found beforehand, the moves to commit at once (see
+        Game.solve); without a predictor, a Predictor probe looks for one.
+        Return (solver, played moves, moves still to play), the playing
+        thread is left in self.player.
+        """
+        if plan is None and self.predictor is None:
+            from Predictor import Predictor
+
+            plan = Predictor().predict(self.game, with_hand).moves
+        solver = self.game.make_copy()
+        chunks: queue.Queue[list[Move] | None] = queue.Queue()
+        played: list[Move] = []
+
+        def play():
+            while (chunk := chunks.get()) is not None:
+                self.execute_move_list(chunk)
+
+        def on_prefix(prefix: list[Move]):
+            played.extend(prefix)
+            chunks.put(prefix)
+
+        self.player = Thread(target=play, daemon=True)
+        self.player.start()
+        try:
+            winning_moves = solver.solve(with_hand, budget, on_prefix, plan)
+        finally:
+            chunks.put(None)
+
+        if winning_moves is not None:
+            winning_moves = winning_moves[len(played) :]
+        return solver, played, winning_moves
 
-    def play_quick_games(
+    def play_games(
         self,
         n: int,
         game_maker: Callable[[], Game] | None,
         on_complete: Callable[[int], bool] | None,
     ):
-        durations = []
-        completed_games = 0
-
-        while completed_games < n:
-            if game_maker is None:
-                self.game = self.make_game()
-            else:
-                self.game = game_maker()
-            start_time = time.time()
-            winning_moves = self.game.solve(False)
-            end_time = time.time()
-
-            if winning_moves is None:
-                if self.next_game(n, completed_games, on_complete):
-                    break
-                continue
-
-            durations.append(end_time - start_time)
-            self.execute_move_list(winning_moves)
-            completed_games += 1
-            if self.next_game(n, completed_games, on_complete):
-                break
+        self.run_games(n, True, game_maker, on_complete)
 
-        dur_mean = mean(durations) if len(durations) > 0 else 0.0
-        dur_std = stdev(durations) if len(durations) > 1 else 0.0
-        print(f"{dur_mean:0.3f}s +/- {dur_std}s")
+    def play_quick_games(
+        self,
+        n: int,
+        game_maker: Callable[[], Game] | None,
+        on_complete: Callable[[int], bool] | None,
+    ):
+        self.run_games(n, False, game_maker, on_complete)
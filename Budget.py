@@ -0,0 +1,64 @@
+import threading
+import time
+
+
+class CancelToken:
+    """Cancellation flag shared by a solver thread and its controller"""
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def reset(self):
+        self.event.clear()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+
+class SolveBudget:
+    """Wall-clock and node limits of one Game.solve, None means unlimited"""
+
+    CANCELLED = "cancelled"
+    TIMEOUT = "timeout"
+    NODES = "nodes"
+
+    check_every = 64  # nodes between two checks, keeps overhead low
+
+    def __init__(
+        self,
+        seconds: float | None = None,
+        nodes: int | None = None,
+        token: CancelToken | None = None,
+    ):
+        self.seconds = seconds
+        self.nodes = nodes
+        self.token = token
+        self.deadline = None
+
+    def start(self):
+        if self.seconds is not None:
+            self.deadline = time.perf_counter() + self.seconds
+
+    def remaining(self, nodes: int):
+        """Budget left after `nodes` nodes, for a search counting from zero"""
+        seconds = None
+        if self.deadline is not None:
+            seconds = max(self.deadline - time.perf_counter(), 0.0)
+        elif self.seconds is not None:
+            seconds = self.seconds
+        nodes_left = None if self.nodes is None else max(self.nodes - nodes, 0)
+        return SolveBudget(seconds, nodes_left, self.token)
+
+    def exceeded(self, nodes: int):
+        """reason to stop searching, or None"""
+        if self.token is not None and self.token.cancelled:
+            return self.CANCELLED
+        if self.nodes is not None and nodes >= self.nodes:
+            return self.NODES
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return self.TIMEOUT
+        return None
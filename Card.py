@@ -1,4 +1,8 @@
 class Card:
+    """Immutable, interned: Card(value, suit) always returns the same object"""
+
+    __slots__ = ("suit", "value", "id", "index")
+
     numb_lookup = {
         "9": "0",
         "8": "9",
@@ -6,10 +10,29 @@ class Card:
         "6": "7",
     }
 
-    def __init__(self, value, suit):
-        self.suit = suit
-        self.value = value
-        self.id = value + suit
+    # distinct cards, Card.index points into this, unknown cards get len(IDS)
+    IDS = ["0R", "0B", "9R", "9B", "8R", "8B", "7R", "7B", "6R", "6B"]
+    IDS += ["FC", "FD", "FH", "FS"]
+    index_lookup = {id: i for i, id in enumerate(IDS)}
+    cards: dict[str, "Card"] = {}
+
+    def __new__(cls, value, suit):
+        card = cls.cards.get(value + suit)
+        if card is None:
+            card = super().__new__(cls)
+            object.__setattr__(card, "suit", suit)
+            object.__setattr__(card, "value", value)
+            object.__setattr__(card, "id", value + suit)
+            index = cls.index_lookup.get(card.id, len(cls.IDS))
+            object.__setattr__(card, "index", index)
+            cls.cards[card.id] = card
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Card is immutable, can't set {name}")
+
+    def __reduce__(self):
+        return Card, (self.value, self.suit)
 
     def __str__(self):
         return self.id
@@ -23,6 +46,23 @@ class Card:
     def is_red(self):
         return self.suit == "R"
 
+    @staticmethod
+    def deck():
+        """All 36 cards: two of each 6~10 per color and four of each face"""
+        cards = [Card(v, s) for v in "09876" for s in "RB" for _ in range(2)]
+        cards += [Card("F", s) for s in "CDHS" for _ in range(4)]
+        return cards
+
+    @staticmethod
+    def from_face(is_red: bool, face: str):
+        """Card from recognition result, see CardBitmap.NAMES"""
+        if face in ["6", "7", "8", "9"]:
+            return Card(face, "R" if is_red else "B")
+        elif face == "10":
+            return Card("0", "R" if is_red else "B")
+        else:
+            return Card("F", face[0])
+
 
 class CardBitmap:
     """12x12 pixels for one card"""
@@ -203,6 +243,17 @@ class CardBitmap:
                 argmin = i
         return argmin, diffs
 
+    @staticmethod
+    def recognize(image, size: int):
+        """Recognize n*n RGB image of card corner, return (is_red, name, diffs)"""
+        red: list[int]
+        blue: list[int]
+        red = image.get_flattened_data(0)  # pyright: ignore[reportAssignmentType]
+        red_avg = sum(red) / len(red)
+        blue = image.get_flattened_data(2)  # pyright: ignore[reportAssignmentType]
+        face, diffs = __class__.compare(blue, size)
+        return red_avg > 200, __class__.NAMES[face], diffs
+
     @staticmethod
     def difference(bitmap: list[int], target: list[int]):
         N = len(bitmap)  # N*N pixels
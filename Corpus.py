@@ -0,0 +1,174 @@
+import argparse
+import mmap
+import random
+import struct
+import sys
+import time
+from array import array
+
+from Budget import SolveBudget
+from Card import Card
+from Game import Game
+from OutOfCore import OutOfCore
+
+
+class Corpus:
+    """Deals and their solutions in a fixed width binary format.
+
+    A deal is DEAL_SIZE bytes, the Card.index of its cards rank by rank,
+    back to front. A solution is one byte per move, OutOfCore.encode_move,
+    and solution i is moves[offsets[i] : offsets[i + 1]]; an empty one is
+    unsolved, a deal is never won as dealt. The file is a header, the deals,
+    the little-endian uint32 offsets and the moves, and is memory mapped,
+    see load.
+    """
+
+    MAGIC = b"CORPUS01"
+    HEADER = struct.Struct("<8sII")  # magic, deals, with_hand
+
+    ranks = 9
+    DEAL_SIZE = 36  # 4 cards per rank
+
+    def __init__(self, deals=None, offsets=None, moves=None, with_hand=False):
+        self.deals = bytearray() if deals is None else deals
+        self.offsets = array("I", [0]) if offsets is None else offsets
+        self.moves = bytearray() if moves is None else moves
+        self.with_hand = with_hand  # the solutions use the hand
+        self.map: mmap.mmap | None = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def encode_deal(cls, game: Game):
+        """DEAL_SIZE bytes of a game as dealt, ValueError for other positions"""
+        data = bytes(
+            Card.index_lookup[id]
+            for rank in game.ranks
+            for stack in rank.stacks
+            for id in stack.get_output()
+        )
+        per_rank = cls.DEAL_SIZE // cls.ranks
+        dealt = all(rank.cards == per_rank for rank in game.ranks)
+        if len(game.ranks) != cls.ranks or not dealt or len(data) != cls.DEAL_SIZE:
+            raise ValueError("only games as dealt fit a corpus")
+        return data
+
+    @classmethod
+    def decode_deal(cls, data):
+        per_rank = cls.DEAL_SIZE // cls.ranks
+        ids = [Card.IDS[index] for index in data]
+        columns = [ids[i : i + per_rank] for i in range(0, cls.DEAL_SIZE, per_rank)]
+        return Game.from_cards([[Card(id[0], id[1]) for id in c] for c in columns])
+
+    def append(self, game: Game, moves=None):
+        """Add game as dealt and its solution, a list of Move or None"""
+        self.deals += self.encode_deal(game)
+        if moves is not None:
+            self.moves += bytes(OutOfCore.encode_move(move) for move in moves)
+        self.offsets.append(len(self.moves))
+
+    def get_game(self, i: int):
+        start = i * self.DEAL_SIZE
+        return self.decode_deal(self.deals[start : start + self.DEAL_SIZE])
+
+    def get_solution(self, i: int):
+        """Move bytes of deal i, empty if unsolved"""
+        return self.moves[self.offsets[i] : self.offsets[i + 1]]
+
+    def get_moves(self, i: int, game: Game | None = None):
+        """Moves of the solution of deal i on game, by default get_game(i);
+        None if unsolved"""
+        data = self.get_solution(i)
+        if len(data) == 0:
+            return None
+        if game is None:
+            game = self.get_game(i)
+        return [OutOfCore.decode_move(game, byte) for byte in data]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, len(self), self.with_hand))
+            f.write(self.deals)
+            offsets = array("I", self.offsets)
+            if sys.byteorder == "big":
+                offsets.byteswap()  # little-endian like HEADER, on every host
+            f.write(offsets.tobytes())
+            f.write(self.moves)
+
+    @classmethod
+    def load(cls, path: str):
+        """Corpus from save; deals and moves stay views of the mapped file and
+        a deal is only decoded by get_game, offsets are copied on big-endian
+        hosts"""
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, with_hand = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError(f"{path} is not a corpus")
+        view = memoryview(data)
+        start = cls.HEADER.size
+        end = start + cls.DEAL_SIZE * count
+        deals = view[start:end]
+        offsets = view[end : end + 4 * (count + 1)].cast("I")
+        if sys.byteorder == "big":
+            offsets = array("I", offsets)  # a copy, the file is little-endian
+            offsets.byteswap()
+        moves = view[end + 4 * (count + 1) :]
+        corpus = cls(deals, offsets, moves, bool(with_hand))
+        corpus.map = data
+        return corpus
+
+
+def main():
+    """Build a corpus of random deals and their solutions, or check one"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("deals", type=int, nargs="?", default=100)
+    parser.add_argument("seed", type=int, nargs="?", default=0)
+    parser.add_argument("--hand", action="store_true", help="solve with hand")
+    parser.add_argument("--seconds", type=float, help="solve budget per deal")
+    parser.add_argument("--no-solve", action="store_true", help="deals only")
+    parser.add_argument("--out", default="corpus.bin")
+    parser.add_argument("--check", help="load a corpus and replay its solutions")
+    args = parser.parse_args()
+
+    if args.check is not None:
+        start_time = time.perf_counter()
+        corpus = Corpus.load(args.check)
+        loaded = time.perf_counter() - start_time
+        solved = won = 0
+        for i in range(len(corpus)):
+            game = corpus.get_game(i)
+            moves = corpus.get_moves(i, game)
+            if moves is None:
+                continue
+            solved += 1
+            for move in moves:
+                game.make_move(move)
+            won += game.is_victory()
+        print(
+            f"{len(corpus)} deals loaded in {loaded * 1e3:.2f}ms, "
+            + f"{solved} solved, {won} replayed to victory "
+            + f"in {time.perf_counter() - start_time:.2f}s"
+        )
+        return
+
+    rng = random.Random(args.seed)
+    corpus = Corpus(with_hand=args.hand)
+    start_time = time.perf_counter()
+    for _ in range(args.deals):
+        game = Game.deal(rng)
+        moves = None
+        if not args.no_solve:
+            budget = None if args.seconds is None else SolveBudget(seconds=args.seconds)
+            moves = game.make_copy().solve(args.hand, budget)
+        corpus.append(game, moves)
+    corpus.save(args.out)
+    print(
+        f"{len(corpus)} deals, {len(corpus.moves)} moves "
+        + f"in {time.perf_counter() - start_time:.1f}s, saved to {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
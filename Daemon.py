@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from Budget import SolveBudget
+from Card import Card
+from Game import Game
+from Session import get_ids
+
+DAEMON_SOCKET = r"solver.sock"  # Board solves through the daemon when present
+
+
+def init_worker(endgame: str | None):
+    if endgame is not None:
+        from Endgame import EndgameTable
+
+        Game.endgame = EndgameTable.load(endgame)
+
+
+def solve_deal(ranks: list, with_hand: bool, seconds, nodes):
+    """(moves as [from, dest] or None, nodes, aborted) of a deal, in a worker"""
+    game = Game.from_cards([[Card(id[0], id[1]) for id in ids] for ids in ranks])
+    moves = game.solve(with_hand, SolveBudget(seconds, nodes))
+    if moves is not None:
+        moves = [[move.from_rank_id, move.dest_rank_id] for move in moves]
+    return moves, game.nodes, game.aborted
+
+
+class SolverDaemon:
+    """Game.solve in long-running worker processes, shared over a Unix socket.
+
+    A request is a JSON line {"deals": [card ids of each rank, ...],
+    "with_hand", "seconds", "nodes"}, answered by a JSON line {"results":
+    [{"moves", "nodes", "aborted", "cached"}, ...]}; {"stats": true} returns
+    the counters instead. The deals of a request are solved in parallel.
+    Results that do not depend on the budget, solutions and proven
+    unsolvable deals, are cached, and a deal already being solved for
+    another client is waited for rather than solved twice. Workers load the
+    endgame table once, and a Corpus warms the cache at start.
+    """
+
+    cache_size = 1 << 20  # cached deals, oldest dropped first
+
+    def __init__(self, workers: int | None = None, endgame: str | None = None):
+        self.pool = ProcessPoolExecutor(
+            workers, initializer=init_worker, initargs=(endgame,)
+        )
+        self.cache: dict[tuple, dict] = {}  # (ranks, with_hand) -> result
+        self.pending: dict[tuple, Future] = {}  # deals being solved
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "deals": 0, "hits": 0, "shared": 0, "solves": 0}
+
+    @staticmethod
+    def key(ranks: list, with_hand: bool):
+        return tuple(tuple(ids) for ids in ranks), bool(with_hand)
+
+    def store(self, key: tuple, result: dict):
+        if len(self.cache) >= self.cache_size:
+            del self.cache[next(iter(self.cache))]
+        self.cache[key] = result
+
+    def warm(self, path: str):
+        """Cache the solved deals of a Corpus file, return how many"""
+        from Corpus import Corpus
+
+        corpus = Corpus.load(path)
+        count = 0
+        for i in range(len(corpus)):
+            game = corpus.get_game(i)
+            moves = corpus.get_moves(i, game)
+            if moves is None:
+                continue
+            pairs = [[move.from_rank_id, move.dest_rank_id] for move in moves]
+            result = {"moves": pairs, "nodes": 0, "aborted": None}
+            with self.lock:
+                self.store(self.key(get_ids(game), corpus.with_hand), result)
+            count += 1
+        return count
+
+    def submit(self, ranks: list, with_hand: bool, seconds, nodes):
+        """Future of the result of a deal, cached or shared when possible"""
+        key = self.key(ranks, with_hand)
+        with self.lock:
+            self.stats["deals"] += 1
+            if key in self.cache:
+                self.stats["hits"] += 1
+                future = Future()
+                future.set_result(dict(self.cache[key], cached=True))
+                return future
+            if key in self.pending:
+                self.stats["shared"] += 1
+                return self.pending[key]
+            self.stats["solves"] += 1
+            solving = self.pool.submit(solve_deal, ranks, with_hand, seconds, nodes)
+            future = Future()
+            self.pending[key] = future
+
+        def done(solving: Future):
+            try:
+                moves, nodes, aborted = solving.result()
+            except Exception as e:
+                with self.lock:
+                    del self.pending[key]
+                future.set_exception(e)
+                return
+            result = {"moves": moves, "nodes": nodes, "aborted": aborted}
+            with self.lock:
+                del self.pending[key]
+                if aborted is None:
+                    self.store(key, result)
+            future.set_result(dict(result, cached=False))
+
+        solving.add_done_callback(done)
+        return future
+
+    def handle(self, request: dict):
+        with self.lock:
+            self.stats["requests"] += 1
+        if request.get("stats"):
+            with self.lock:
+                sizes = {"cache": len(self.cache), "pending": len(self.pending)}
+                return dict(self.stats, **sizes)
+        with_hand = request.get("with_hand", False)
+        seconds, nodes = request.get("seconds"), request.get("nodes")
+        futures = [
+            self.submit(ranks, with_hand, seconds, nodes) for ranks in request["deals"]
+        ]
+        return {"results": [future.result() for future in futures]}
+
+    def serve(self, path: str = DAEMON_SOCKET):
+        """Answer requests on a Unix socket at path until interrupted"""
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = daemon.handle(json.loads(line))
+                    except Exception as e:
+                        response = {"error": f"{type(e).__name__}: {e}"}
+                    try:
+                        self.wfile.write(json.dumps(response).encode() + b"\n")
+                    except OSError:
+                        return  # client gone, e.g. cancelled
+
+        if os.path.exists(path):
+            os.remove(path)  # left by a daemon that did not stop cleanly
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.remove(path)
+            self.pool.shutdown(cancel_futures=True)  # running deals end with budget
+
+
+class SolverClient:
+    """Front-end of a SolverDaemon, solves like Game.solve.
+
+    One connection is kept open and reopened after an error. A cancelled
+    budget token drops the connection at once; the daemon still finishes
+    that deal within its budget and caches it.
+    """
+
+    poll = 0.1  # seconds between two checks of the budget token
+
+    def __init__(self, path: str = DAEMON_SOCKET):
+        self.path = path
+        self.sock: socket.socket | None = None
+        self.buffer = b""
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.buffer = b""
+
+    def request(self, data: dict, budget: SolveBudget | None = None):
+        """Response of the daemon, None if budget was cancelled first"""
+        if self.sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            sock.settimeout(self.poll)
+            self.sock = sock
+        try:
+            self.sock.sendall(json.dumps(data).encode() + b"\n")
+            while b"\n" not in self.buffer:
+                if budget is not None and budget.exceeded(0) == budget.CANCELLED:
+                    self.close()
+                    return None
+                try:
+                    chunk = self.sock.recv(1 << 16)
+                except socket.timeout:
+                    continue
+                if len(chunk) == 0:
+                    raise ConnectionError("solver daemon closed the connection")
+                self.buffer += chunk
+        except OSError:
+            self.close()
+            raise
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+
+    def solve_many(
+        self, games: list[Game], with_hand=False, budget: SolveBudget | None = None
+    ):
+        """Results of games in one request, solved in parallel by the daemon"""
+        request = {"deals": [get_ids(game) for game in games], "with_hand": with_hand}
+        if budget is not None:
+            request["seconds"], request["nodes"] = budget.seconds, budget.nodes
+        response = self.request(request, budget)
+        if response is None:
+            return None
+        return response["results"]
+
+    def solve(self, game: Game, with_hand=False, budget: SolveBudget | None = None):
+        """Move list to victory, None if unsolvable or out of budget.
+
+        game.nodes and game.aborted are set like game.solve does.
+        """
+        results = self.solve_many([game], with_hand, budget)
+        if results is None:
+            game.nodes, game.aborted = 0, SolveBudget.CANCELLED
+            return None
+        result = results[0]
+        game.nodes, game.aborted = result["nodes"], result["aborted"]
+        if result["moves"] is None:
+            return None
+        return [game.get_move(from_id, dest_id) for from_id, dest_id in result["moves"]]
+
+    def stats(self):
+        return self.request({"stats": True})
+
+
+def main():
+    """Serve Game.solve to every front-end on a Unix socket, or query it"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--socket", default=DAEMON_SOCKET)
+    parser.add_argument("--workers", type=int, help="solver processes (default: CPUs)")
+    parser.add_argument("--endgame", help="endgame table for the workers")
+    parser.add_argument("--corpus", help="warm the cache with a Corpus.py file")
+    parser.add_argument("--stats", action="store_true", help="query a running daemon")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(SolverClient(args.socket).stats())
+        return
+
+    daemon = SolverDaemon(args.workers, args.endgame)
+    if args.corpus is not None:
+        start_time = time.perf_counter()
+        count = daemon.warm(args.corpus)
+        elapsed = time.perf_counter() - start_time
+        print(f"{count} solutions cached from {args.corpus} in {elapsed:.2f}s")
+    print(f"solving on {args.socket}")
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # stop like Ctrl+C
+    try:
+        daemon.serve(args.socket)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
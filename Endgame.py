@@ -0,0 +1,214 @@
+import argparse
+import bisect
+import mmap
+import random
+import struct
+import time
+from collections import deque
+
+from Budget import SolveBudget
+from Game import Game
+
+
+class EndgameTable:
+    """Solved late-game positions, looked up by Game.key.
+
+    Holds positions with at most max_stacks stacks and an empty hand, each
+    with the distance to victory and the first move of a shortest solution.
+    Moves are stored against ranks sorted by rank key (see get_order), so
+    they apply to every column order of a position, like Game.key itself.
+    The file is a header, then sorted keys, moves and distances, and is
+    memory mapped, see load.
+    """
+
+    MAGIC = b"ENDGAME1"
+    HEADER = struct.Struct("<8sII")  # magic, entries, max_stacks
+
+    max_stacks = 14
+    explore_nodes = 50000  # give up an endgame bigger than this while building
+
+    def __init__(self, keys, moves, distances, max_stacks: int | None = None):
+        self.keys = keys  # sorted Game.key values
+        self.moves = moves  # encode_move in get_order, one byte per entry
+        self.distances = distances  # moves to victory
+        if max_stacks is not None:
+            self.max_stacks = max_stacks
+        self.map: mmap.mmap | None = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def get_order(game: Game):
+        """Rank ids sorted by rank key, the column order moves refer to"""
+        return sorted(range(len(game.ranks)), key=lambda i: game.ranks[i].key)
+
+    @staticmethod
+    def encode_move(order: list[int], move):
+        """One byte: from and dest position in order, -1 for the hand"""
+        from_id, dest_id = move.from_rank_id, move.dest_rank_id
+        from_pos = -1 if from_id == -1 else order.index(from_id)
+        dest_pos = -1 if dest_id == -1 else order.index(dest_id)
+        return (from_pos + 1) * 10 + dest_pos + 1
+
+    @staticmethod
+    def decode_move(game: Game, order: list[int], byte: int):
+        from_pos, dest_pos = byte // 10 - 1, byte % 10 - 1
+        from_id = -1 if from_pos == -1 else order[from_pos]
+        dest_id = -1 if dest_pos == -1 else order[dest_pos]
+        return game.get_move(from_id, dest_id)
+
+    def is_candidate(self, game: Game):
+        """Whether game may be tabulated, cheaper than a lookup"""
+        stacks = 36 - game.get_progress()
+        return len(game.hand.stacks) == 0 and stacks <= self.max_stacks
+
+    def lookup(self, game: Game):
+        """(first move, distance) of a shortest solution, None if not tabulated"""
+        i = bisect.bisect_left(self.keys, game.key)
+        if i == len(self.keys) or self.keys[i] != game.key:
+            return None
+        order = self.get_order(game)
+        return self.decode_move(game, order, self.moves[i]), self.distances[i]
+
+    def get_solution(self, game: Game):
+        """Moves from game to victory, None if not tabulated; game is unchanged"""
+        if not self.is_candidate(game):
+            return None
+        moves = []
+        undos = []
+        while (entry := self.lookup(game)) is not None and entry[1] > 0:
+            moves.append(entry[0])
+            undos.append(game.make_move(entry[0]))
+        victory = game.is_victory()
+        while len(undos) > 0:
+            game.unmake_move(undos.pop())
+        return moves if victory else None
+
+    # building
+
+    @classmethod
+    def explore(cls, game: Game, entries: dict):
+        """Retrograde analysis of every position reachable from game.
+
+        Explores forward in place, then walks back from the won positions
+        along reversed moves, so each position gets its exact distance.
+        Adds tabulated positions to entries, key -> (move byte, distance).
+        Return False if there were more than explore_nodes positions.
+        """
+        parents: dict[int, list[tuple[int, int]]] = {game.key: []}
+        won = []
+        # depth first, in place: (moves left to try, undo of the move here)
+        stack = [(game.get_moves(), None)]
+        if game.is_victory():
+            won.append(game.key)
+        while len(stack) > 0:
+            moves, undo = stack[-1]
+            if len(moves) == 0:
+                stack.pop()
+                if undo is not None:
+                    game.unmake_move(undo)
+                continue
+            move = moves.pop()
+            key = game.key
+            move_byte = cls.encode_move(cls.get_order(game), move)
+            child = game.get_move_key(move)
+            if child in parents:
+                parents[child].append((key, move_byte))
+                continue
+            if len(parents) > cls.explore_nodes:
+                while len(stack) > 0:
+                    if stack[-1][1] is not None:
+                        game.unmake_move(stack[-1][1])
+                    stack.pop()
+                return False
+            parents[child] = [(key, move_byte)]
+            undo = game.make_move(move)
+            if game.is_victory():
+                won.append(child)
+            stack.append((game.get_moves(), undo))
+
+        distance = {key: 0 for key in won}
+        queue = deque(won)
+        while len(queue) > 0:
+            key = queue.popleft()
+            for parent, move_byte in parents[key]:
+                if parent in distance:
+                    continue
+                distance[parent] = distance[key] + 1
+                known = entries.get(parent)
+                if known is None or known[1] > distance[parent]:
+                    entries[parent] = (move_byte, distance[parent])
+                queue.append(parent)
+        for key in won:
+            entries[key] = (0, 0)
+        return True
+
+    @classmethod
+    def build(cls, games: list[Game], max_stacks: int | None = None):
+        """Table of the endgames the solutions of games run into"""
+        table = cls([], [], [], max_stacks)
+        entries: dict[int, tuple[int, int]] = {}
+        for game in games:
+            moves = game.solve(False, SolveBudget(seconds=30))
+            if moves is None:
+                continue
+            for move in moves:
+                if table.is_candidate(game) and game.key not in entries:
+                    cls.explore(game.make_copy(), entries)
+                    break
+                game.make_move(move)
+
+        keys = sorted(entries)
+        table.keys = keys
+        table.moves = bytes(entries[k][0] for k in keys)
+        table.distances = bytes(min(entries[k][1], 255) for k in keys)
+        return table
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, len(self.keys), self.max_stacks))
+            f.write(struct.pack(f"<{len(self.keys)}Q", *self.keys))
+            f.write(bytes(self.moves))
+            f.write(bytes(self.distances))
+
+    @classmethod
+    def load(cls, path: str):
+        """Table from save; keys, moves and distances stay views of the mapped
+        file, so a lookup only pages in the keys its bisection touches"""
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, max_stacks = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError(f"{path} is not an endgame table")
+        view = memoryview(data)
+        start = cls.HEADER.size
+        keys = view[start : start + 8 * count].cast("Q")
+        moves = view[start + 8 * count : start + 9 * count]
+        distances = view[start + 9 * count : start + 10 * count]
+        table = cls(keys, moves, distances, max_stacks)
+        table.map = data
+        return table
+
+
+def main():
+    """Build an endgame table from the solutions of random deals"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("deals", type=int, nargs="?", default=100)
+    parser.add_argument("seed", type=int, nargs="?", default=0)
+    parser.add_argument("--stacks", type=int, help="most stacks of a position")
+    parser.add_argument("--out", default="endgame.bin")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start_time = time.perf_counter()
+    table = EndgameTable.build([Game.deal(rng) for _ in range(args.deals)], args.stacks)
+    table.save(args.out)
+    print(
+        f"{len(table)} positions of at most {table.max_stacks} stacks "
+        + f"in {time.perf_counter() - start_time:.1f}s, saved to {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import queue
+from collections.abc import Callable
+
+
+class Event:
+    """Base of everything published on an EventBus"""
+
+
+class Progress(Event):
+    """Games done of a run, with PlayMetrics.summary_line"""
+
+    def __init__(self, done: int, total: int, summary: str = ""):
+        self.done = done
+        self.total = total
+        self.summary = summary
+
+
+class RunFinished(Event):
+    """A run of games ended, stopped or failed with error"""
+
+    def __init__(self, done: int, stopped=False, error: Exception | None = None):
+        self.done = done
+        self.stopped = stopped
+        self.error = error
+
+
+class CaptureReady(Event):
+    """A capture is recognized, from_job if it came from a queued job"""
+
+    def __init__(self, capture, from_job=True):
+        self.capture = capture
+        self.from_job = from_job
+
+
+class CaptureFailed(Event):
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class GeometryDetected(Event):
+    """Geometry detected for a window size, to be cached by the consumer"""
+
+    def __init__(self, size: tuple[int, int], geometry):
+        self.size = size
+        self.geometry = geometry
+
+
+class EventBus:
+    """Thread-safe channel from worker threads to the Tk thread.
+
+    publish() may be called from any thread. pump() runs on the consumer
+    thread and calls the handlers subscribed to each event's type or base
+    types, in publish order; poll() keeps pumping from a Tk event loop, so
+    handlers may touch widgets.
+    """
+
+    poll_ms = 50
+
+    def __init__(self):
+        self.events: queue.SimpleQueue[Event] = queue.SimpleQueue()
+        self.handlers: dict[type, list[Callable]] = {}
+
+    def subscribe(self, event_type: type, handler: Callable):
+        self.handlers.setdefault(event_type, []).append(handler)
+
+    def publish(self, event: Event):
+        self.events.put(event)
+
+    def pump(self):
+        """handle all events published so far, return how many"""
+        count = 0
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return count
+            count += 1
+            for event_type in type(event).__mro__:
+                for handler in self.handlers.get(event_type, []):
+                    handler(event)
+
+    def poll(self, root):
+        """pump now and every poll_ms on root's event loop"""
+        try:
+            self.pump()
+        finally:
+            root.after(self.poll_ms, self.poll, root)
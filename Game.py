@@ -1,27 +1,75 @@
 from collections import deque
+from collections.abc import Callable
 import copy
+import random
 
-import time
-import sys
-
+from Budget import SolveBudget
+from Card import Card
 from Move import Move
 from Rank import Rank
 from Stack import Stack
+from Zobrist import Zobrist
 
 
 class Game:
-    def __init__(self, rank_info, hand=Rank(-1, [])):
+    # get_front values past the card indices
+    EMPTY = len(Card.IDS) + 1
+    HAND_EMPTY = EMPTY + 1
+    HAND_FULL = EMPTY + 2
+
+    prefix_every = 1024  # nodes between two common prefix checks in anytime mode
+    plan_moves = 8  # moves of a known solution committed at once in anytime mode
+    goal_step = 6  # progress of one solve_by_goals stage
+    sample_every = 1024  # nodes between two on_sample calls
+    # solved late-game positions, solve stops on reaching one, see EndgameTable
+    endgame = None
+    # verify Zobrist keys against full state strings while solving, slow
+    debug_hash = False
+
+    def __init__(self, rank_info, hand=None, key=None):
         self.ranks = rank_info
-        self.hand = hand
+        self.hand = hand if hand is not None else Rank(-1, [])
+        # Zobrist key of the state, kept up to date by make_move
+        self.key = key if key is not None else self.compute_key()
 
         self.move_stack = deque([])
         self.move_stack_len = 0
 
         self.winning_moves = []
-        self.hashes = set(())
+        self.path_moves: list[Move] = []  # moves made on the board while solving
+        self.path_undos: list = []
+        self.hashes: set[int] = set(())  # keys of visited states
+        self.hash_strings: dict[int, str] = {}  # key -> hash(), debug_hash only
 
         self.done = False
         self.check_hand = False
+        self.aborted: str | None = None  # see SolveBudget
+        self.nodes = 0  # nodes expanded by solve
+        self.goal: int | None = None  # progress solve stops at, see solve_by_goals
+        self.duplicates = 0  # moves to known states dropped by expand
+        # called every sample_every nodes while solving, see Profiler
+        self.on_sample: Callable[[Game], None] | None = None
+
+        # move_table[from][dest]: Move or None, indexed by rank id so the hand
+        # is last, rows and columns of touched ranks are rebuilt lazily
+        self.move_table: list[list[Move | None]] | None = None
+        self.touched: set[int] = set(())  # rank ids changed since then
+        self.pair_moves: list[list[Move | None]] = []
+        self.fronts: list[int] = []  # get_front of each rank
+        self.accepts: list[list[bool]] = []  # get_accepts of each rank
+
+    @staticmethod
+    def deal(rng: random.Random):
+        """Random deal of the 36 cards into 9 ranks"""
+        cards = Card.deck()
+        rng.shuffle(cards)
+        return Game.from_cards([cards[i * 4 : i * 4 + 4] for i in range(9)])
+
+    @staticmethod
+    def from_cards(columns):
+        """Game from dealt cards, one list of Card per rank"""
+        ranks = [Rank(i, Stack.from_cards(cards)) for i, cards in enumerate(columns)]
+        return Game(ranks)
 
     def get_hand(self):
         return self.hand
@@ -40,55 +88,158 @@ class Game:
 
         return rank_list
 
-    def get_rank_moves(self, ref_rank):
-        moves = []
-        hand_move = None
+    def get_rank_moves(self, ref_rank, to_hand=None):
+        """Moves from ref_rank, into the hand if to_hand (default check_hand)"""
+        if to_hand is None:
+            to_hand = self.check_hand
+
+        row = self.get_move_table()[ref_rank.rank]
+        # moves into different empty ranks lead to the same state, keep the first
+        fronts = self.fronts
+        empty = fronts.index(Game.EMPTY) if Game.EMPTY in fronts else -1
+        moves = [
+            move
+            for move in row[:-1]
+            if move is not None
+            and (fronts[move.dest_rank_id] != Game.EMPTY or move.dest_rank_id == empty)
+        ]
 
-        if len(ref_rank.stacks) == 0:
-            return moves
-
-        ref_rank_len = len(ref_rank.stacks)
+        # If we can move a card somewhere /and/ the hand, discard the hand move
+        if to_hand and len(moves) == 0 and row[-1] is not None:
+            moves.append(row[-1])
 
-        for rank in self.get_ranks(self.check_hand):
-            rank_len = len(rank.stacks)
+        return moves
 
-            # Can't move into own rank
-            if rank.rank == ref_rank.rank:
-                continue
-            # Don't check empty ranks
-            if ref_rank_len == 0:
+    @staticmethod
+    def get_front(rank):
+        """What a stack would be moved onto at rank, index into get_accepts"""
+        if rank.rank == -1:
+            return Game.HAND_FULL if len(rank.stacks) > 0 else Game.HAND_EMPTY
+        if len(rank.stacks) == 0:
+            return Game.EMPTY
+        return rank.stacks[-1].front.index
+
+    @staticmethod
+    def get_accepts(ref_rank):
+        """Whether the top stack of ref_rank can go onto each get_front"""
+        if len(ref_rank.stacks) == 0:
+            return [False] * (Game.HAND_FULL + 1)
+        top = ref_rank.stacks[-1]
+        return Stack.combine_table[top.back.index] + [
+            ref_rank.rank == -1 or len(ref_rank.stacks) > 1,  # EMPTY
+            ref_rank.rank != -1 and top.length == 1,  # HAND_EMPTY
+            False,  # HAND_FULL
+        ]
+
+    def get_move_table(self):
+        """move_table, brought up to date with the ranks touched since last use"""
+        if len(self.touched) == 0 and self.move_table is not None:
+            return self.move_table
+
+        ranks = self.get_ranks(True)
+        if self.move_table is None:
+            # one Move per pair, so equal moves are the same object
+            self.pair_moves = [
+                [Move(b.rank, a.rank) if a is not b else None for b in ranks]
+                for a in ranks
+            ]
+            self.move_table = [[None] * len(ranks) for _ in ranks]
+            self.fronts = [0] * len(ranks)
+            self.accepts = [[]] * len(ranks)
+            self.touched = set(rank.rank for rank in ranks)
+
+        # every touched rank is rebuilt: rank keys ignore face stack lengths,
+        # which decide whether the top stack may go into the hand
+        changed = [id % len(ranks) for id in self.touched]
+        self.touched.clear()
+
+        table = self.move_table
+        fronts = self.fronts
+        for id in changed:
+            fronts[id] = self.get_front(ranks[id])
+            self.accepts[id] = self.get_accepts(ranks[id])
+
+        for a, accepts in enumerate(self.accepts):
+            moves = self.pair_moves[a]
+            if a in changed:
+                table[a] = [
+                    moves[b] if accepts[front] else None
+                    for b, front in enumerate(fronts)
+                ]
                 continue
-
-            move = Move(rank.rank, ref_rank.rank)
-
-            if rank_len == 0:
-                if ref_rank.rank == -1:
-                    moves.append(move)
-                elif rank.rank == -1:
-                    if ref_rank.stacks[-1].length == 1:
-                        hand_move = move
-                else:
-                    if ref_rank_len > 1:
-                        moves.append(move)
-            elif rank_len > 0:
-                rank_stack = rank.stacks[-1]
-                can_combine = Stack.get_combine(ref_rank.stacks[-1], rank_stack)
-
-                if ref_rank.rank == -1:
-                    if can_combine is not None:
-                        moves.append(move)
-                elif rank.rank == -1:
-                    continue
-                else:
-                    if can_combine is not None:
-                        moves.append(move)
-
-        # If we can move a card somewhere /and/ the hand, discard the hand move
-        if len(moves) == 0 and hand_move:
-            moves.append(hand_move)
-
+            row = table[a]
+            for b in changed:
+                row[b] = moves[b] if accepts[fronts[b]] else None
+        return table
+
+    def get_move(self, from_rank_id, dest_rank_id):
+        """The shared Move object of a pair of ranks, legal or not"""
+        if self.move_table is None:
+            self.get_move_table()
+        return self.pair_moves[from_rank_id][dest_rank_id]
+
+    def get_moves(self):
+        moves = []
+        for rank in self.get_ranks(self.check_hand):
+            moves += self.get_rank_moves(rank)
         return moves
 
+    def is_completing_move(self, move):
+        """Move gathers the last faces of a suit onto a rank holding the rest"""
+        from_rank = self.get_rank(move.from_rank_id)
+        dest_rank = self.get_rank(move.dest_rank_id)
+        if dest_rank.rank == -1 or len(dest_rank.stacks) != 1:
+            return False
+        from_stack = from_rank.stacks[-1]
+        dest_stack = dest_rank.stacks[0]
+        return (
+            from_stack.is_faces
+            and dest_stack.is_faces
+            and from_stack.length + dest_stack.length == 4
+            and Stack.can_combine(from_stack, dest_stack)
+        )
+
+    def get_safe_prefix(self, with_hand=False):
+        """Moves that keep the deal solvable: forced moves and face completions"""
+        game = self.make_copy()
+        game.check_hand = with_hand
+        seen = {game.key}
+        prefix = []
+
+        while not game.is_victory():
+            moves = game.get_moves()
+            safe = [m for m in moves if game.is_completing_move(m)]
+            if len(safe) == 0 and len(moves) == 1:
+                safe = moves  # forced
+            if len(safe) == 0:
+                break
+
+            game.make_move(safe[0])
+            if game.key in seen:
+                break
+            seen.add(game.key)
+            prefix.append(safe[0])
+
+        return prefix
+
+    def get_common_prefix(self, known: int):
+        """Prefix shared by all queued move lists, if longer than `known`"""
+        if not self.move_stack:
+            return None
+        # children copy their parent's list, so shared ancestors are the same objects
+        first = self.move_stack[0]
+        last = self.move_stack[-1]
+        length = known
+        while length < min(len(first), len(last)) and first[length] is last[length]:
+            length += 1
+
+        while length > known:
+            move = first[length - 1]
+            if all(m[length - 1] is move for m in self.move_stack):
+                return first[:length]
+            length -= 1
+        return None
+
     def hash(self):
         hashes = []
 
@@ -100,6 +251,44 @@ class Game:
 
         return out_str
 
+    def compute_key(self):
+        """Zobrist key from scratch, see Zobrist"""
+        key = self.hand.key
+        for rank in self.ranks:
+            key += rank.key
+        return key & Zobrist.MASK
+
+    def get_move_key(self, move):
+        """Zobrist key after move, without making it"""
+        from_rank = self.get_rank(move.from_rank_id)
+        dest_rank = self.get_rank(move.dest_rank_id)
+        stack = from_rank.stacks[-1]
+        from_depth = len(from_rank.stacks) - 1
+        depth = len(dest_rank.stacks)
+
+        from_key = from_rank.key ^ from_rank.get_stack_key(from_depth, stack)
+        if depth == 0:
+            dest_key = dest_rank.key ^ dest_rank.get_stack_key(0, stack)
+        else:
+            # key of the combined stack, without building it
+            top = dest_rank.stacks[-1]
+            combined_key = Zobrist.get_keys(top.back.id, stack.front.id)[depth - 1]
+            dest_key = (
+                dest_rank.key ^ dest_rank.get_stack_key(depth - 1, top) ^ combined_key
+            )
+
+        key = self.key - from_rank.key - dest_rank.key + from_key + dest_key
+        return key & Zobrist.MASK
+
+    def verify_key(self):
+        """Check the incremental key and look for collisions, see debug_hash"""
+        if self.key != self.compute_key():
+            raise Exception(f"Zobrist key {self.key:016x} is out of date")
+        full = self.hash()
+        known = self.hash_strings.setdefault(self.key, full)
+        if known != full:
+            raise Exception(f"Zobrist collision {self.key:016x}: {known} {full}")
+
     def is_victory(self):
         points = 0
         if len(self.hand.stacks) > 0:
@@ -107,7 +296,7 @@ class Game:
 
         for rank in self.ranks:
             rank_stacks = len(rank.stacks)
-            rank_cards = rank.get_total_cards()
+            rank_cards = rank.cards
             if rank_stacks == 0:
                 points += 1
             elif rank_stacks == 1 and (rank_cards == 4 or rank_cards == 5):
@@ -118,6 +307,13 @@ class Game:
 
         return False
 
+    def get_progress(self):
+        """Cards lying on a card of their own stack, 28 at victory"""
+        stacks = len(self.hand.stacks)
+        for rank in self.ranks:
+            stacks += len(rank.stacks)
+        return 36 - stacks
+
     def hash_exists(self, hash):
         return hash in self.hashes
 
@@ -159,88 +355,271 @@ class Game:
         for rank in self.ranks:
             new_rank_array.append(rank.make_copy())
 
-        return Game(new_rank_array, new_hand)
+        return Game(new_rank_array, new_hand, self.key)
 
     def make_move(self, move):
+        """Make move in place, return the undo record for unmake_move"""
         from_rank = self.get_rank(move.from_rank_id)
         dest_rank = self.get_rank(move.dest_rank_id)
+        old_key = from_rank.key + dest_rank.key
+        undo = (move, from_rank.stacks[-1], None, self.key)
+        self.touched.add(move.from_rank_id)
+        self.touched.add(move.dest_rank_id)
 
         if len(dest_rank.stacks) == 0:
-            dest_rank.stacks.append(from_rank.stacks[-1])
-            from_rank.stacks.pop(-1)
+            dest_rank.push_stack(from_rank.pop_stack())
         else:
-            combined = Stack.get_combine(from_rank.stacks[-1], dest_rank.stacks[-1])
-            dest_rank.stacks[-1] = combined
-            from_rank.stacks.pop(-1)
+            top = dest_rank.stacks[-1]
+            combined = Stack.get_combine(from_rank.stacks[-1], top)
+            dest_rank.pop_stack()
+            dest_rank.push_stack(combined)
+            from_rank.pop_stack()
+            undo = (move, undo[1], top, self.key)
+
+        new_key = from_rank.key + dest_rank.key
+        self.key = (self.key - old_key + new_key) & Zobrist.MASK
+        return undo
+
+    def unmake_move(self, undo):
+        """Take back a move, undo is (move, moved stack, covered top, key)"""
+        move, stack, top, key = undo
+        from_rank = self.get_rank(move.from_rank_id)
+        dest_rank = self.get_rank(move.dest_rank_id)
+        self.touched.add(move.from_rank_id)
+        self.touched.add(move.dest_rank_id)
+
+        dest_rank.pop_stack()
+        if top is not None:
+            dest_rank.push_stack(top)
+        from_rank.push_stack(stack)
+        self.key = key
+
+    def walk_to(self, move_list):
+        """Bring the board from the current path to move_list in place.
+
+        Queued move lists share their ancestors' Move objects and neighbours
+        in the queue share long prefixes, so only the tail is unmade/made.
+        """
+        path = self.path_moves
+        common = 0
+        length = min(len(path), len(move_list))
+        while common < length and path[common] is move_list[common]:
+            common += 1
+
+        while len(self.path_undos) > common:
+            self.unmake_move(self.path_undos.pop())
+        for move in move_list[common:]:
+            self.path_undos.append(self.make_move(move))
+        self.path_moves = move_list
 
     def iterate(self):
+        """Expand the next queued state in place, on this very board"""
         move_list = self.move_stack.popleft()
         self.move_stack_len -= 1
-        new_game = self.make_copy()
+        self.nodes += 1
 
-        for move in move_list:
-            new_game.make_move(move)
+        self.walk_to(move_list)
 
-        if new_game.is_victory():
+        if self.is_victory() or (
+            self.goal is not None and self.get_progress() >= self.goal
+        ):
             self.winning_moves.append(move_list)
             return
 
-        hash = new_game.hash()
-        if self.hash_exists(hash):
-            return
+        if self.endgame is not None:
+            tail = self.endgame.get_solution(self)
+            if tail is not None:
+                self.winning_moves.append(move_list + tail)
+                return
 
-        self.hashes.add(hash)
+        if self.debug_hash:
+            self.verify_key()
+        # as with the copies this used to expand, only the first move may go
+        # into the hand
+        self.expand(self, move_list, False)
 
-        for rank in new_game.get_ranks(self.check_hand):
-            moves_to_add = new_game.get_rank_moves(rank)
-            for move in moves_to_add:
-                move_list_copy = copy.copy(move_list)
-                move_list_copy.append(move)
+    def expand(self, game, move_list, to_hand=None):
+        """Queue moves of game not leading to a known state, keys are O(1)"""
+        moves = []
+        for rank in game.get_ranks(self.check_hand):
+            moves += game.get_rank_moves(rank, to_hand)
 
-                self.move_stack.append(move_list_copy)
-                self.move_stack_len += 1
+        for move in game.prune_moves(moves):
+            key = game.get_move_key(move)
+            if self.hash_exists(key):
+                self.duplicates += 1
+                continue
+            self.hashes.add(key)
 
-    def solve(self, with_hand=False):
-        self.check_hand = with_hand
+            move_list_copy = copy.copy(move_list)
+            move_list_copy.append(move)
 
-        for rank in self.get_ranks(self.check_hand):
-            moves = self.get_rank_moves(rank)
-            for move in moves:
-                self.move_stack.append([move])
-                self.move_stack_len += 1
+            self.move_stack.append(move_list_copy)
+            self.move_stack_len += 1
 
-        self.hashes.add(self.hash())
+    def prune_moves(self, moves):
+        """Drop moves dominated by others, before any key is computed.
 
-        iter = 0
-        time_start = time.time_ns() - 10
+        A face completion is always safe (see get_safe_prefix), so it becomes
+        the only move. Moves taking back the last one are not pruned here, they
+        lead to the parent state, whose key is already known.
+        """
+        for move in moves:
+            if self.is_completing_move(move):
+                return [move]
+        return moves
 
-        debug = False
+    def solve(
+        self,
+        with_hand=False,
+        budget: SolveBudget | None = None,
+        on_prefix: Callable[[list[Move]], None] | None = None,
+        plan: list[Move] | None = None,
+    ):
+        """Move list to victory, None if unsolvable or out of budget.
+
+        Breadth first, so the solution is a shortest one unless Game.endgame
+        ends the search at the first tabulated position it reaches.
+
+        When the budget runs out or its token is cancelled, the reason is
+        left in self.aborted.
+
+        Anytime mode: with on_prefix, the first plan_moves moves of plan, a
+        solution found beforehand such as Prediction.moves, are committed
+        before searching, or the safe prefix without a plan. Whenever all
+        remaining candidates agree on more leading moves, those are committed
+        too. Each commit calls on_prefix with the new moves, so they can be
+        played while the search goes on. The result starts with every
+        committed move; when the budget runs out while they still follow
+        plan, the result is plan.
+        """
+        self.check_hand = with_hand
+        self.aborted = None
+        if budget is not None:
+            budget.start()
+
+        root = self
+        committed: list[Move] = []
+        if on_prefix is not None:
+            if plan is not None:
+                # the shared Move objects, get_common_prefix compares identity
+                plan = [self.get_move(m.from_rank_id, m.dest_rank_id) for m in plan]
+                committed = plan[: self.plan_moves]
+            else:
+                committed = self.get_safe_prefix(with_hand)
+            root = self.make_copy()
+            root.check_hand = with_hand
+            for move in committed:
+                root.make_move(move)
+            if len(committed) > 0:
+                on_prefix(list(committed))
+            if root.is_victory():
+                return committed
+
+        self.hashes.add(root.key)
+        self.expand(root, committed)
+        moves = self.search(budget, on_prefix, committed)
+
+        out_of_budget = self.aborted in (SolveBudget.TIMEOUT, SolveBudget.NODES)
+        if moves is None and out_of_budget and plan is not None:
+            if all(a is b for a, b in zip(committed, plan)):
+                return plan
+        return moves
 
+    def search(
+        self,
+        budget: SolveBudget | None = None,
+        on_prefix: Callable[[list[Move]], None] | None = None,
+        committed: list[Move] | None = None,
+    ):
+        """Run the queued search of solve until a solution, a dead end or the
+        end of the started budget; committed is what on_prefix was given, and
+        is extended in place"""
+        if committed is None:
+            committed = []
         while self.move_stack:
             self.iterate()
 
-            if debug:
-                now_time = time.time_ns()
-                time_since = now_time - time_start
+            # breadth first, the first solution found is a shortest one
+            if len(self.winning_moves) > 0:
+                break
 
-                mean_time = iter / time_since * 1e3
+            if budget is not None and self.nodes % budget.check_every == 0:
+                self.aborted = budget.exceeded(self.nodes)
+                if self.aborted is not None:
+                    break
 
-                out_str = "\r"
-                out_str += str(iter) + " iterations\t\t"
-                out_str += str(self.move_stack_len) + " items\t\t"
-                out_str += str(round(time_since / 1e9)) + "s\t\t"
-                out_str += str(round(mean_time / 1e3, 0)) + "us\t\t"
+            if on_prefix is not None and self.nodes % self.prefix_every == 0:
+                prefix = self.get_common_prefix(len(committed))
+                if prefix is not None:
+                    new = prefix[len(committed) :]
+                    committed += new
+                    on_prefix(new)
 
-                sys.stdout.write(out_str)
-                sys.stdout.flush()
+            if self.on_sample is not None and self.nodes % self.sample_every == 0:
+                self.on_sample(self)
 
-                iter += 1
+        self.walk_to([])  # back to the dealt state
 
         if len(self.winning_moves) > 0:
             return self.winning_moves[0]
         else:
             return None
 
+    def solve_by_goals(self, with_hand=False, budget: SolveBudget | None = None):
+        """Move list to victory, None if unsolvable or out of budget.
+
+        Solves in stages, each a breadth first search for goal_step more
+        progress (see get_progress) whose moves are kept, so the frontier only
+        spans a stage instead of the whole solution. Solutions need not be
+        shortest. When a later stage runs into a dead end, the search of the
+        first stage, a breadth first search of the whole deal like solve, goes
+        on without its goal, skipping every state the failed stage expanded:
+        none of them leads to more progress, let alone victory.
+        """
+        self.check_hand = with_hand
+        self.aborted = None
+        if budget is not None:
+            budget.start()
+
+        game = self.make_copy()
+        moves: list[Move] = []
+        first: Game | None = None
+        while not game.is_victory():
+            stage = game.make_copy()
+            stage.goal = game.get_progress() + self.goal_step
+            stage_budget = None if budget is None else budget.remaining(self.nodes)
+            stage_moves = stage.solve(with_hand, stage_budget)
+            self.nodes += stage.nodes
+            if first is None:
+                first = stage
+            if stage_moves is None:
+                self.aborted = stage.aborted
+                break
+            for move in stage_moves:
+                game.make_move(move)
+            moves += stage_moves
+        else:
+            return moves
+
+        if self.aborted is not None or first is None or stage is first:
+            return None  # a failed first stage has searched the whole deal
+
+        # first stopped at the first state reaching its goal, queue it again
+        done = first.nodes
+        first.goal = None
+        first.hashes |= stage.hashes
+        first.move_stack.appendleft(first.winning_moves.pop())
+        first.move_stack_len += 1
+        fallback_budget = None
+        if budget is not None:
+            fallback_budget = budget.remaining(self.nodes - done)
+            fallback_budget.start()
+        moves = first.search(fallback_budget)
+        self.nodes += first.nodes - done
+        self.aborted = first.aborted
+        return moves
+
 
 # ranks = [
 #     Rank(0, [Card("7", "R"), Card("F", "C"), Card("F", "C"), Card("F", "C")]),
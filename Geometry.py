@@ -0,0 +1,283 @@
+import argparse
+import json
+import math
+import os
+import re
+
+from PIL import Image, ImageChops
+
+from Backend import Bbox
+
+GEOMETRY_CACHE = r"geometry.json"  # detected geometry per window size
+
+
+class Geometry:
+    """Board geometry in the 1920x1080 coordinates of the Gui settings"""
+
+    def __init__(
+        self,
+        desk: Bbox,
+        card_size: tuple[int, int],
+        hand: tuple[int, int],
+        newgame: tuple[int, int],
+    ):
+        self.desk = desk
+        self.card_size = card_size
+        self.hand = hand
+        self.newgame = newgame
+
+    def to_json(self):
+        return {
+            "desk": list(self.desk),
+            "card_size": list(self.card_size),
+            "hand": list(self.hand),
+            "newgame": list(self.newgame),
+        }
+
+    @staticmethod
+    def from_json(data: dict):
+        desk = data["desk"]
+        return Geometry(
+            (desk[0], desk[1], desk[2], desk[3]),
+            (data["card_size"][0], data["card_size"][1]),
+            (data["hand"][0], data["hand"][1]),
+            (data["newgame"][0], data["newgame"][1]),
+        )
+
+    def __str__(self):
+        return (
+            f"desk={self.desk} card={self.card_size} "
+            + f"hand={self.hand} newgame={self.newgame}"
+        )
+
+
+class GeometryDetector:
+    """Locate the card grid, hand slot and new game button on a screenshot.
+
+    Works on a fresh deal of the whole window. Card outlines are dark on the
+    light table: the card tops are the first row with one outline segment
+    per rank at even spacing, and the stacked card edges in a rank give the
+    vertical spacing. The hand slot and the button bar are the gold of the
+    table stripes.
+    """
+
+    ranks = 9
+    dark_level = 190  # card outlines are darker than this, table and faces lighter
+    border_fill = 0.7  # part of a card width covered by a horizontal card edge
+
+    def __init__(self, ranks: int | None = None):
+        if ranks is not None:
+            self.ranks = ranks
+
+    @staticmethod
+    def runs(row: bytes):
+        """(start, end) of the runs of 1 in a mask row"""
+        return [m.span() for m in re.finditer(b"\x01+", row)]
+
+    def detect(self, image: Image.Image):
+        """Geometry of image, ValueError if the board is not found"""
+        image = image.convert("RGB")
+        w, h = image.size
+        dark = image.convert("L").point(lambda v: v < self.dark_level).tobytes()
+        hue, saturation, value = image.convert("HSV").split()
+        # gold: hue about 40 degrees, saturated but not bright
+        gold = ImageChops.multiply(
+            ImageChops.multiply(
+                hue.point(lambda v: 255 if 20 <= v <= 40 else 0),
+                saturation.point(lambda v: 255 if v >= 90 else 0),
+            ),
+            value.point(lambda v: 255 if 60 <= v <= 200 else 0),
+        )
+        gold = gold.point(lambda v: v > 0).tobytes()
+
+        top, tops = self.find_card_tops(dark, w, h)
+        # card outlines a few rows below the rounded top corners
+        y = top + max(3, h // 135)
+        row = dark[y * w : (y + 1) * w]
+        runs = self.runs(row)
+        lefts = [max(r[1] for r in runs if r[1] <= t[0]) for t in tops]
+        rights = [min(r[0] for r in runs if r[0] >= t[1]) for t in tops]
+        card_w = rights[-1] - lefts[-1]
+
+        x = (tops[0][0] + tops[0][1]) // 2
+        desk_top = top
+        while dark[desk_top * w + x]:
+            desk_top += 1
+
+        # ranks of a fresh deal are alike, odd ones out have lines in card art
+        ranks = [self.find_card_edges(dark, w, h, left, card_w, y) for left in lefts]
+        counts = [len(edges) for edges in ranks]
+        best = ranks[counts.index(max(counts, key=counts.count))]
+        if len(best) < 2:
+            raise ValueError("card edges not found")
+        last_top = best[-2][0][1] if len(best) > 2 else desk_top
+        bottom = (best[-1][-1][0] + best[-1][-1][1]) // 2
+        card_h = bottom - last_top
+        margin_y = (last_top - desk_top) / max(len(best) - 2, 1)
+        dn = math.ceil(36 / self.ranks)  # 36 cards
+        desk_bottom = round(desk_top + (dn - 1) * margin_y + card_h)
+
+        hand = self.find_hand(gold, w, h, desk_top)
+        cards_end = best[-1][-1][1]
+        newgame = self.find_newgame(gold, w, h, lefts[0], rights[-1], cards_end)
+
+        sx, sy = 1920 / w, 1080 / h
+        return Geometry(
+            (
+                round(lefts[0] * sx),
+                round(desk_top * sy),
+                round(rights[-1] * sx),
+                round(desk_bottom * sy),
+            ),
+            (round(card_w * sx), round(card_h * sy)),
+            (round(hand[0] * sx), round(hand[1] * sy)),
+            (round(newgame[0] * sx), round(newgame[1] * sy)),
+        )
+
+    def find_card_tops(self, dark: bytes, w: int, h: int):
+        """first row with the top outline of every rank, and those outlines"""
+        for y in range(h // 4, h * 3 // 4):
+            runs = [
+                r
+                for r in self.runs(dark[y * w : (y + 1) * w])
+                if w * 0.04 <= r[1] - r[0] <= w * 0.09
+            ]
+            if len(runs) != self.ranks:
+                continue
+            lengths = sorted(r[1] - r[0] for r in runs)
+            if lengths[-1] - lengths[0] > lengths[0] * 0.1:
+                continue
+            gaps = [runs[i + 1][0] - runs[i][0] for i in range(len(runs) - 1)]
+            if max(gaps) - min(gaps) <= max(2, w // 500):
+                return y, runs
+        raise ValueError("card tops not found")
+
+    def find_card_edges(
+        self, dark: bytes, w: int, h: int, left: int, card_w: int, y: int
+    ):
+        """horizontal card edges of one rank, top to bottom, as (first, end)
+        rows of the lines of each edge: the outline and the frame inside it"""
+        # the rank ends with its left outline
+        end = y
+        while end < h and dark[end * w + left - 2]:
+            end += 1
+        lines: list[tuple[int, int]] = []
+        for row in range(y - max(3, h // 135), min(end + 2, h)):
+            strip = dark[row * w + left : row * w + left + card_w]
+            if strip.count(1) < card_w * self.border_fill:
+                continue
+            if len(lines) > 0 and lines[-1][1] == row:
+                lines[-1] = (lines[-1][0], row + 1)
+            else:
+                lines.append((row, row + 1))
+        # edges are thin lines, thick ones are the art of face cards
+        lines = [line for line in lines if line[1] - line[0] <= max(3, h // 180)]
+        edges: list[list[tuple[int, int]]] = []
+        for line in lines:
+            if len(edges) > 0 and line[0] - edges[-1][-1][1] < h // 90:
+                edges[-1].append(line)
+            else:
+                edges.append([line])
+        return edges
+
+    def find_hand(self, gold: bytes, w: int, h: int, desk_top: int):
+        """center of the gold outlined hand slot above the cards"""
+        columns = []  # (x, top, bottom) of long vertical gold runs
+        for x in range(w):
+            column = gold[x : desk_top * w : w]
+            runs = [r for r in self.runs(column) if r[1] - r[0] >= h * 0.12]
+            if len(runs) > 0:
+                columns.append((x, *max(runs, key=lambda r: r[1] - r[0])))
+        if len(columns) < 2:
+            raise ValueError("hand slot not found")
+        left, right = columns[0], columns[-1]
+        return ((left[0] + right[0]) // 2, (left[1] + left[2]) // 2)
+
+    def find_newgame(
+        self, gold: bytes, w: int, h: int, left: int, right: int, cards_end: int
+    ):
+        """center of the last wide button of the gold bar below the cards"""
+        for y in range(cards_end, h):
+            strip = gold[y * w + left : y * w + right]
+            if strip.count(1) < (right - left) * 0.5:
+                continue
+            # button text is lower, look at the top rows of the bar
+            row = gold[(y + 2) * w : (y + 3) * w]
+            buttons = [
+                r for r in self.runs(row) if r[1] - r[0] >= (right - left) * 0.15
+            ]
+            if len(buttons) == 0:
+                break
+            start, end = buttons[-1]
+            # height of the bar beside the button text
+            bar_bottom = y
+            while bar_bottom < h and gold[bar_bottom * w + start + (end - start) // 8]:
+                bar_bottom += 1
+            return ((start + end) // 2, (y + bar_bottom) // 2)
+        raise ValueError("new game button not found")
+
+
+class GeometryCache:
+    """Geometry per window size, detected once and kept in a JSON file"""
+
+    def __init__(self, path: str = GEOMETRY_CACHE):
+        self.path = path
+        self.sizes: dict[str, Geometry] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.sizes = {k: Geometry.from_json(v) for k, v in data.items()}
+
+    @staticmethod
+    def key(size: tuple[int, int]):
+        return f"{size[0]}x{size[1]}"
+
+    def get(self, size: tuple[int, int]):
+        return self.sizes.get(self.key(size))
+
+    def snapshot(self):
+        """Copy of the cached geometries by window size key, for other threads"""
+        return dict(self.sizes)
+
+    def put(self, size: tuple[int, int], geometry: Geometry):
+        self.sizes[self.key(size)] = geometry
+        with open(self.path, "w") as f:
+            data = {k: v.to_json() for k, v in self.sizes.items()}
+            json.dump(data, f, indent=2)
+
+    def lookup(
+        self,
+        image: Image.Image,
+        detector: GeometryDetector | None = None,
+        redetect=False,
+    ):
+        """cached geometry of the window size of image, detected on a miss"""
+        geometry = None if redetect else self.get(image.size)
+        if geometry is None:
+            geometry = (detector or GeometryDetector()).detect(image)
+            self.put(image.size, geometry)
+        return geometry
+
+
+def main():
+    """Detect board geometry on screenshots of the whole game window"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--cache", help=f"also store in a cache, e.g. {GEOMETRY_CACHE}")
+    args = parser.parse_args()
+
+    cache = GeometryCache(args.cache) if args.cache is not None else None
+    for file in args.images:
+        image = Image.open(file).convert("RGB")
+        try:
+            geometry = GeometryDetector().detect(image)
+        except ValueError as e:
+            print(f"{file}: {e}")
+            continue
+        print(f"{file} {image.width}x{image.height}: {geometry}")
+        if cache is not None:
+            cache.put(image.size, geometry)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,35 @@
+import hashlib
 import math
+import queue
 import tkinter as tk
+from collections.abc import Callable
 from threading import Thread
 from tkinter import filedialog, messagebox, ttk
 from typing import TypedDict
 
-from PIL import Image, ImageGrab
+from PIL import Image
 from PIL.ImageTk import PhotoImage
 from ttkthemes import ThemedTk
 
+from Backend import Bbox
 from Board import Board
 from Card import Card, CardBitmap
+from Events import (
+    CaptureFailed,
+    CaptureReady,
+    EventBus,
+    GeometryDetected,
+    Progress,
+    RunFinished,
+)
 from Game import Game
+from Geometry import Geometry, GeometryCache, GeometryDetector
+from Metrics import GameMetrics
+from Predictor import Predictor
 from Rank import Rank
+from Session import DealCapture, SessionRecorder
 from Stack import Stack
 
-type Bbox = tuple[int, int, int, int]  # (left, top, right, bottom)
-
 
 def gui_prepare():
     import platform
@@ -31,60 +45,120 @@ def gui_prepare():
 
 class Screenshot:
     image: Image.Image | None = None
-    bbox: Bbox = (0, 0, 1920, 1080)
+    bbox: Bbox = (0, 0, 1920, 1080)  # window on screen, its size is the resolution
+    roi: Bbox = (0, 0, 1920, 1080)  # part of the window in image, window pixels
+
+    @classmethod
+    def capture_window(cls, name: str, layout: "Layout | None" = None):
+        """capture screenshot by window's title, only layout.roi if given"""
+        window = cls.find_window(name)
+        if window is None:
+            return False
+        cls.image, cls.bbox, cls.roi = cls.grab_window(*window, layout)
+        return True
 
     @classmethod
-    def capture_window(cls, name: str):
-        """capture screenshot by window's title"""
+    def find_window(cls, name: str) -> tuple[int, Bbox] | None:
+        """window id and bbox by window's title, None after showing why not"""
+        try:
+            return cls.locate_window(name)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return None
+
+    @classmethod
+    def locate_window(cls, name: str) -> tuple[int, Bbox]:
+        """window id and bbox by window's title, ValueError saying why not.
+        Safe off the Tk thread."""
         name = name.strip()
         if not name:
-            messagebox.showerror(
-                "Error",
+            raise ValueError(
                 "Please input window title. Default game window is: "
-                + Gui.DEFAULT_WINDOW_TITLE,
+                + Gui.DEFAULT_WINDOW_TITLE
             )
-            return False
 
         hwnd, bbox = cls.get_window_by_name(name)
         if hwnd == 0:
-            messagebox.showerror("Error", f'No visible window named "{name}" is found!')
-            return False
+            raise ValueError(f'No visible window named "{name}" is found!')
+        return hwnd, bbox
 
-        cls.image = ImageGrab.grab(all_screens=True, window=hwnd)  # whole window
-        if bbox[3] - bbox[1] > cls.image.height:
+    @staticmethod
+    def grab_window(
+        hwnd: int, bbox: Bbox, layout: "Layout | None" = None
+    ) -> tuple[Image.Image, Bbox, Bbox]:
+        """screenshot of a window, its client bbox and the roi kept of it.
+
+        With a layout only the screen area of layout.roi is grabbed, the
+        whole window is grabbed for calibration. Safe off the Tk thread.
+        """
+        from PIL import ImageGrab  # needs a display, load on first capture
+
+        if layout is not None:
+            bbox = Screenshot.get_client_bbox(hwnd)
+            roi = layout.roi(Screenshot.scale(bbox), Screenshot.size(bbox))
+            screen_roi = (
+                bbox[0] + roi[0],
+                bbox[1] + roi[1],
+                bbox[0] + roi[2],
+                bbox[1] + roi[3],
+            )
+            image = ImageGrab.grab(bbox=screen_roi, all_screens=True)
+            return image.convert("RGB"), bbox, roi
+
+        image = ImageGrab.grab(all_screens=True, window=hwnd)  # whole window
+        if bbox[3] - bbox[1] > image.height:
             # with title bar
-            cls.bbox = (bbox[0], bbox[3] - cls.image.height, bbox[2], bbox[3])
-        else:
-            cls.bbox = bbox  # frameless
-        return True
+            bbox = (bbox[0], bbox[3] - image.height, bbox[2], bbox[3])
+        return image, bbox, (0, 0, image.width, image.height)
 
-    @classmethod
-    def select_image(cls):
-        """use image file as screenshot"""
+    @staticmethod
+    def select_image_file():
+        """ask for a screenshot file, None if cancelled"""
         file = filedialog.askopenfilename(
             title="Select a screenshot",
             filetypes=[("Image", "*.png;*.jpg;*.jpeg"), ("All", "*.*")],
             initialdir="./ex",
         )
-        if not file:
-            return False  # cancel
-        cls.image = Image.open(file)
-        cls.bbox = (0, 0, cls.image.width, cls.image.height)
-        return True
+        return file or None
+
+    @staticmethod
+    def open_image(file: str) -> tuple[Image.Image, Bbox, Bbox]:
+        """image file as screenshot, its bbox and roi"""
+        image = Image.open(file)
+        image.load()
+        bbox = (0, 0, image.width, image.height)
+        return image, bbox, bbox
+
+    @classmethod
+    def size(cls, bbox: Bbox | None = None):
+        """window size, the screenshot may only hold its roi"""
+        bbox = bbox if bbox is not None else cls.bbox
+        return (bbox[2] - bbox[0], bbox[3] - bbox[1])
 
     @classmethod
-    def scale(cls):
-        if cls.image is None:
+    def scale(cls, bbox: Bbox | None = None):
+        w, h = cls.size(bbox)
+        if w <= 0 or h <= 0:
             return (1.0, 1.0)
-        return (cls.image.width / 1920, cls.image.height / 1080)
+        return (w / 1920, h / 1080)
+
+    @classmethod
+    def to_roi(cls, bbox: Bbox, roi: Bbox | None = None) -> Bbox:
+        """window bbox -> bbox in a screenshot of roi"""
+        roi = roi if roi is not None else cls.roi
+        return (bbox[0] - roi[0], bbox[1] - roi[1], bbox[2] - roi[0], bbox[3] - roi[1])
 
     @classmethod
     def transform(
-        cls, *, crop: Bbox | None = None, resize: tuple[int, int] | None = None
+        cls,
+        *,
+        crop: Bbox | None = None,
+        resize: tuple[int, int] | None = None,
+        image: Image.Image | None = None,
     ):
-        if cls.image is None:
+        img = image if image is not None else cls.image
+        if img is None:
             return Image.new("RGB", (1, 1))
-        img = cls.image
         if crop is not None:
             img = img.crop(crop)
         if resize is not None and (resize[0] != img.width or resize[1] != img.height):
@@ -107,9 +181,256 @@ class Screenshot:
         print(hwnd, rect, bbox)
         return hwnd, bbox
 
+    @staticmethod
+    def get_client_bbox(hwnd: int) -> Bbox:
+        """Get bbox of the client area of a window on screen, no title bar"""
+        from ctypes import byref, windll
+        from ctypes.wintypes import POINT, RECT
+
+        rect = RECT()
+        windll.user32.GetClientRect(hwnd, byref(rect))
+        origin = POINT(0, 0)
+        windll.user32.ClientToScreen(hwnd, byref(origin))
+        return (origin.x, origin.y, origin.x + rect.right, origin.y + rect.bottom)
+
+
+class Layout:
+    """Snapshot of the card region settings, usable off the Tk thread"""
+
+    signature_reduce = 4  # column strips are downsampled by this for signatures
+    # 16 gray levels, so capture noise doesn't change a signature
+    signature_levels = bytes(v >> 4 for v in range(256))
+
+    def __init__(
+        self,
+        desk: Bbox,
+        ranks: int,
+        card_size: tuple[int, int],
+        ocr_offset: tuple[int, int],
+        ocr_n: int,
+        hand: tuple[int, int] | None = None,
+    ):
+        self.desk = desk  # resolution is (1920, 1080)
+        self.ranks = ranks
+        self.card_width, self.card_height = card_size
+        self.ocr_offset = ocr_offset
+        self.ocr_n = ocr_n
+        self.hand = hand
+
+    def with_geometry(self, geometry: Geometry):
+        """this layout on a detected board, OCR settings are kept"""
+        return Layout(
+            geometry.desk,
+            self.ranks,
+            geometry.card_size,
+            self.ocr_offset,
+            self.ocr_n,
+            geometry.hand,
+        )
+
+    def card_marginx(self):
+        dw = self.desk[2] - self.desk[0]
+        return (dw - self.card_width) / (self.ranks - 1) - self.card_width
+
+    def card_marginy(self):
+        dh = self.desk[3] - self.desk[1]
+        dn = math.ceil(36 / self.ranks)  # 36 cards
+        return (dh - self.card_height) / (dn - 1)
+
+    def card_bbox(self, x: int, y: int) -> Bbox:
+        """resolution is (1920, 1080)"""
+        left = round(
+            x * (self.card_width + self.card_marginx())
+            + self.desk[0]
+            + self.ocr_offset[0]
+        )
+        top = round(y * self.card_marginy() + self.desk[1] + self.ocr_offset[1])
+        return (left, top, left + self.ocr_n, top + self.ocr_n)
+
+    def roi(self, scale: tuple[float, float], size: tuple[int, int], pad=4) -> Bbox:
+        """window region of every OCR box and the hand slot, in window pixels"""
+        dn = math.ceil(36 / self.ranks)  # 36 cards
+        boxes = [self.card_bbox(x, y) for x in range(self.ranks) for y in range(dn)]
+        if self.hand is not None:
+            w, h = self.card_width // 2, self.card_height // 2
+            hx, hy = self.hand
+            boxes.append((hx - w, hy - h, hx + w, hy + h))
+        left, top, right, bottom = Gui.bbox_scale(
+            (
+                min(b[0] for b in boxes),
+                min(b[1] for b in boxes),
+                max(b[2] for b in boxes),
+                max(b[3] for b in boxes),
+            ),
+            scale,
+        )
+        return (
+            max(left - pad, 0),
+            max(top - pad, 0),
+            min(right + pad, size[0]),
+            min(bottom + pad, size[1]),
+        )
+
+    def key(self):
+        """settings that change what is recognized, the hand is not one"""
+        card_size = (self.card_width, self.card_height)
+        return (self.desk, self.ranks, card_size, self.ocr_offset, self.ocr_n)
+
+    def signatures(self, image: Image.Image, bbox: Bbox, roi: Bbox):
+        """cheap hash of each rank's strip of OCR boxes, equal when unchanged"""
+        dn = math.ceil(36 / self.ranks)  # 36 cards
+        scale = Screenshot.scale(bbox)
+        result: list[bytes] = []
+        for x in range(self.ranks):
+            strip = Screenshot.to_roi(
+                Gui.bbox_scale(
+                    (*self.card_bbox(x, 0)[:2], *self.card_bbox(x, dn - 1)[2:]), scale
+                ),
+                roi,
+            )
+            small = image.crop(strip).convert("L").reduce(self.signature_reduce)
+            digest = hashlib.blake2b(repr(self.key()).encode(), digest_size=16)
+            digest.update(small.tobytes().translate(self.signature_levels))
+            result.append(digest.digest())
+        return result
+
+    def boxes(self, bbox: Bbox, roi: Bbox):
+        """OCR box of every card, rank by rank, in a screenshot of roi"""
+        dn = math.ceil(36 / self.ranks)  # 36 cards
+        scale = Screenshot.scale(bbox)
+        return [
+            [
+                Screenshot.to_roi(Gui.bbox_scale(self.card_bbox(x, y), scale), roi)
+                for y in range(dn)
+            ]
+            for x in range(self.ranks)
+        ]
+
+    def detect_cards(
+        self,
+        image: Image.Image,
+        bbox: Bbox,
+        roi: Bbox,
+        known: dict[int, list[tuple[bool, str]]] | None = None,
+    ):
+        """(is_red, name) of every card, rank by rank; ranks in known are reused"""
+        n = self.ocr_n  # n*n pixels
+        result: list[list[tuple[bool, str]]] = []
+        for x, boxes in enumerate(self.boxes(bbox, roi)):
+            if known is not None and x in known:
+                result.append(known[x])
+                continue
+            stack: list[tuple[bool, str]] = []
+            for y, c2 in enumerate(boxes):
+                img = Screenshot.transform(crop=c2, resize=(n, n), image=image)
+                is_red, name, diffs = CardBitmap.recognize(img, n)
+                print(f"card({x},{y}) red={is_red} name={name} {diffs}")
+                stack.append((is_red, name))
+            result.append(stack)
+        print(result)
+        return result
+
+
+class Capture:
+    """Screenshot with its recognized cards and canvas preview"""
+
+    def __init__(
+        self,
+        image: Image.Image,
+        bbox: Bbox,
+        roi: Bbox,
+        cards: list[list[tuple[bool, str]]],
+        preview: Image.Image | None,
+        signatures: list[bytes] | None = None,
+    ):
+        self.image = image
+        self.bbox = bbox
+        self.roi = roi  # part of the window in image
+        self.cards = cards
+        self.preview = preview  # image at the scale of the window fitted to canvas
+        self.signatures = signatures or []  # Layout.signatures of the ranks
+        self.geometry: Geometry | None = None  # detected board, if recognized on it
+
+    @staticmethod
+    def fit_size(wh: tuple[int, int], canvas_wh: tuple[int, int]):
+        """keep w/h ratio and fit to canvas"""
+        scale = min(canvas_wh[0] / wh[0], canvas_wh[1] / wh[1], 1)
+        return (int(wh[0] * scale), int(wh[1] * scale))
+
+    @staticmethod
+    def preview_size(bbox: Bbox, roi: Bbox, canvas_wh: tuple[int, int]):
+        """size of the roi when the whole window is fitted to canvas"""
+        w, h = Screenshot.size(bbox)
+        fitted = Capture.fit_size((w, h), canvas_wh)
+        size = (
+            (roi[2] - roi[0]) * fitted[0] // w,
+            (roi[3] - roi[1]) * fitted[1] // h,
+        )
+        return (max(size[0], 1), max(size[1], 1))
+
+    @staticmethod
+    def recognize(
+        image: Image.Image,
+        bbox: Bbox,
+        roi: Bbox,
+        layout: Layout,
+        canvas_wh: tuple[int, int],
+        previous: "Capture | None" = None,
+    ):
+        """the slow part of a capture: card recognition and preview downscale.
+
+        Ranks whose signature matches the previous capture keep its cards.
+        """
+        signatures = layout.signatures(image, bbox, roi)
+        known = {}
+        if previous is not None and len(previous.signatures) == len(signatures):
+            for x in range(len(signatures)):
+                if signatures[x] == previous.signatures[x]:
+                    known[x] = previous.cards[x]
+        cards = layout.detect_cards(image, bbox, roi, known)
+        size = Capture.preview_size(bbox, roi, canvas_wh)
+        preview = Screenshot.transform(resize=size, image=image)
+        return Capture(image, bbox, roi, cards, preview, signatures)
+
+
+class CaptureWorker:
+    """Runs capture jobs in a background thread, one at a time in order.
+
+    Results are published on the EventBus as CaptureReady/CaptureFailed,
+    so their handlers run on the Tk thread.
+    """
+
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+        self.jobs: queue.Queue[Callable[[], Capture]] = queue.Queue()
+        self.pending = 0  # jobs submitted and not handled yet, Tk thread only
+        bus.subscribe(CaptureReady, self.on_done)
+        bus.subscribe(CaptureFailed, self.on_done)
+
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, job: Callable[[], Capture]):
+        """queue a job, jobs run back to back while the UI stays responsive"""
+        self.pending += 1
+        self.jobs.put(job)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                self.bus.publish(CaptureReady(job()))
+            except Exception as e:
+                self.bus.publish(CaptureFailed(e))
+
+    def on_done(self, event: CaptureReady | CaptureFailed):
+        if not isinstance(event, CaptureReady) or event.from_job:
+            self.pending -= 1
+
 
 class Gui:
     DEFAULT_WINDOW_TITLE = "EXAPUNKS"
+    redraw_ms = 150  # debounce of redraws on setting changes
 
     def __init__(self, root: tk.Tk):
         self.root = root
@@ -136,11 +457,19 @@ class Gui:
         self.newgame_x = tk.IntVar(value=1400)
         self.newgame_y = tk.IntVar(value=900)
 
+        # board geometry of each window size, see Geometry
+        self.geometry_cache = GeometryCache()
+        self.auto_geometry = tk.BooleanVar(value=True)
+
         self.offset_x = tk.IntVar(value=5)
         self.offset_y = tk.IntVar(value=4)
         self.ocr_n = tk.IntVar(value=14)
 
         self.solve_text = tk.StringVar()
+        self.solve_budget = tk.IntVar(value=30)  # seconds per deal, 0 = unlimited
+        self.solve_anytime = tk.BooleanVar(value=False)
+        self.solve_record = tk.BooleanVar(value=False)  # see Session
+        self.solve_hopeless = tk.StringVar(value="solve")  # see Board.hopeless_policy
         self.info_text = tk.StringVar()
 
         self.ocr_x = tk.IntVar(value=0)
@@ -178,12 +507,36 @@ class Gui:
         ttk.Button(capture_frame, text="Stop", command=self.press_solve_stop).grid(
             row=1, column=4, padx=5, pady=5
         )
+        ttk.Button(capture_frame, text="Export...", command=self.export_metrics).grid(
+            row=1, column=5, padx=5, pady=5
+        )
 
         self.solve_prog = ttk.Progressbar(capture_frame, length=200, value=0, maximum=1)
         self.solve_prog.grid(row=2, column=0, columnspan=2, padx=5, pady=5)
         ttk.Label(capture_frame, textvariable=self.solve_text).grid(
-            row=2, column=2, columnspan=3, padx=5, pady=5, sticky=tk.EW
+            row=2, column=2, columnspan=4, padx=5, pady=5, sticky=tk.EW
+        )
+
+        ttk.Label(capture_frame, text="Budget (s):").grid(
+            row=3, column=0, padx=5, pady=5
         )
+        ttk.Spinbox(
+            capture_frame, textvariable=self.solve_budget, from_=0, to=3600, increment=5
+        ).grid(row=3, column=1, padx=5, pady=5)
+        ttk.Checkbutton(
+            capture_frame, text="Play while solving", variable=self.solve_anytime
+        ).grid(row=3, column=2, columnspan=2, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(capture_frame, text="Hopeless:").grid(row=3, column=4, padx=5, pady=5)
+        ttk.Combobox(
+            capture_frame,
+            textvariable=self.solve_hopeless,
+            values=["solve", "hand", "skip"],
+            state="readonly",
+            width=8,
+        ).grid(row=3, column=5, padx=5, pady=5)
+        ttk.Checkbutton(
+            capture_frame, text="Record session", variable=self.solve_record
+        ).grid(row=3, column=6, padx=5, pady=5, sticky=tk.W)
 
         sections.add(capture_frame, text="Window")
 
@@ -290,6 +643,16 @@ class Gui:
             **grid_opts
         )
         grid_opts["column"] += 1
+        ttk.Button(roi_frame, text="Detect", command=self.detect_geometry).grid(
+            **grid_opts
+        )
+        grid_opts["column"] += 1
+        ttk.Button(roi_frame, text="Save", command=self.save_geometry).grid(**grid_opts)
+        grid_opts["column"] += 1
+        ttk.Checkbutton(roi_frame, text="Auto", variable=self.auto_geometry).grid(
+            **grid_opts
+        )
+        grid_opts["column"] += 1
         ttk.Label(roi_frame, textvariable=self.info_text).grid(
             columnspan=5, sticky=tk.EW, **grid_opts
         )
@@ -334,26 +697,204 @@ class Gui:
 
         self.solve_stop = False  # stop botton pressed
         self.solve_th: Thread | None = None  # game solve thread
+        self.solve_total = 0  # games of the current run
+
+        self.ocr_result: list[list[tuple[bool, str]]] | None = None
+        self.preview: Image.Image | None = None  # screenshot fitted to canvas
+        self.last_capture: Capture | None = None  # unchanged ranks are reused
+        self.game_capture: Capture | None = None  # same, solving thread only
+        # canvas caches, see render_canvas
+        self.tk_previews: dict[tuple[int, int], PhotoImage] = {}
+        self.template_images: list[PhotoImage] = []
+        self.ocr_canvas_result: list | None = None  # ocr_result on the canvas
+        self.ocr_key: tuple | None = None  # screenshot, crop and size of OCR
+        self.redraw_id: str | None = None
+        for var in [
+            self.desk_left,
+            self.desk_top,
+            self.desk_right,
+            self.desk_bottom,
+            self.card_ranks,
+            self.card_width,
+            self.card_height,
+            self.hand_x,
+            self.hand_y,
+            self.newgame_x,
+            self.newgame_y,
+            self.offset_x,
+            self.offset_y,
+            self.ocr_n,
+            self.ocr_x,
+            self.ocr_y,
+        ]:
+            var.trace_add("write", self.schedule_redraw)
+        self.canvas.bind("<Configure>", self.schedule_redraw)
+        self.layout = self.get_layout()  # for threads, see update_board
+        self.window_title = self.DEFAULT_WINDOW_TITLE
+        self.canvas_size = (800, 450)
+
+        # everything worker threads report to the UI goes through the bus
+        self.bus = EventBus()
+        self.worker = CaptureWorker(self.bus)
+        self.bus.subscribe(CaptureReady, self.on_capture)
+        self.bus.subscribe(CaptureFailed, self.on_capture_error)
+        self.bus.subscribe(GeometryDetected, self.on_geometry)
+        self.bus.subscribe(Progress, self.on_progress)
+        self.bus.subscribe(RunFinished, self.on_run_finished)
+        self.bus.poll(root)
 
     def capture_window(self):
-        """Capture window and render on canvas"""
-        try:
-            if Screenshot.capture_window(self.window_name.get()):
-                self.detect_cards()
-                self.render_canvas()
-        except Exception as e:
-            messagebox.showerror("Screenshot Failed", f"Error: {e}")
-            raise e
+        """Capture window in the background, then render on canvas"""
+        window = Screenshot.find_window(self.window_name.get())
+        if window is None:
+            return
+        layout, canvas_size = self.get_layout(), self.get_canvas_size()
+        previous, geometries = self.last_capture, self.get_geometries()
+        self.worker.submit(
+            lambda: self.recognize(
+                *Screenshot.grab_window(*window),
+                layout,
+                canvas_size,
+                previous,
+                geometries,
+            )
+        )
+        self.show_capture_status()
 
     def select_image_file(self):
-        """Select image file and render on canvas"""
+        """Select image file, recognize it in the background and render"""
+        file = Screenshot.select_image_file()
+        if file is None:
+            return  # cancel
+        layout, canvas_size = self.get_layout(), self.get_canvas_size()
+        previous, geometries = self.last_capture, self.get_geometries()
+        self.worker.submit(
+            lambda: self.recognize(
+                *Screenshot.open_image(file),
+                layout,
+                canvas_size,
+                previous,
+                geometries,
+            )
+        )
+        self.show_capture_status()
+
+    def recognize(
+        self,
+        image: Image.Image,
+        bbox: Bbox,
+        roi: Bbox,
+        layout: Layout,
+        canvas_wh: tuple[int, int],
+        previous: Capture | None = None,
+        geometries: dict[str, Geometry] | None = None,
+        redetect=False,
+    ):
+        """Capture.recognize against previous, from any thread.
+
+        With geometries, a snapshot of the geometry cache, a capture of the
+        whole window is recognized on the geometry cached for its size,
+        detected when missing or redetect. Only arguments are read, and a
+        detected geometry is published for on_geometry to cache.
+        """
+        geometry = None
+        if geometries is not None and roi == (0, 0, image.width, image.height):
+            if not redetect:
+                geometry = geometries.get(GeometryCache.key(image.size))
+            try:
+                if geometry is None:
+                    geometry = GeometryDetector(layout.ranks).detect(image)
+                    self.bus.publish(GeometryDetected(image.size, geometry))
+                layout = layout.with_geometry(geometry)
+            except ValueError as e:
+                print(f"geometry not detected, using settings: {e}")
+                geometry = None
+        capture = Capture.recognize(image, bbox, roi, layout, canvas_wh, previous)
+        capture.geometry = geometry
+        return capture  # on_capture makes it the last capture
+
+    def detect_geometry(self):
+        """Detect the board on the shown screenshot again, then recognize"""
+        image, bbox, roi = Screenshot.image, Screenshot.bbox, Screenshot.roi
+        if image is None or roi != (0, 0, image.width, image.height):
+            messagebox.showerror("Error", "Capture the whole window first")
+            return
+        layout, canvas_size = self.get_layout(), self.get_canvas_size()
+        previous, geometries = self.last_capture, self.geometry_cache.snapshot()
+        self.worker.submit(
+            lambda: self.recognize(
+                image, bbox, roi, layout, canvas_size, previous, geometries, True
+            )
+        )
+        self.show_capture_status()
+
+    def get_geometries(self):
+        """Snapshot of the geometry cache when calibrating, else None"""
+        if not self.auto_geometry.get():
+            return None
+        return self.geometry_cache.snapshot()
+
+    def on_geometry(self, event: GeometryDetected):
+        """cache a geometry detected by a worker, on the Tk thread"""
+        self.geometry_cache.put(event.size, event.geometry)
+
+    def save_geometry(self):
+        """Keep the settings as the geometry of the shown window size"""
+        if Screenshot.image is None:
+            return
+        self.geometry_cache.put(Screenshot.size(), self.get_geometry())
+
+    def get_geometry(self):
+        return Geometry(
+            (
+                int(self.desk_left.get()),
+                int(self.desk_top.get()),
+                int(self.desk_right.get()),
+                int(self.desk_bottom.get()),
+            ),
+            (int(self.card_width.get()), int(self.card_height.get())),
+            (int(self.hand_x.get()), int(self.hand_y.get())),
+            (int(self.newgame_x.get()), int(self.newgame_y.get())),
+        )
+
+    def set_geometry(self, geometry: Geometry):
+        self.desk_left.set(geometry.desk[0])
+        self.desk_top.set(geometry.desk[1])
+        self.desk_right.set(geometry.desk[2])
+        self.desk_bottom.set(geometry.desk[3])
+        self.card_width.set(geometry.card_size[0])
+        self.card_height.set(geometry.card_size[1])
+        self.hand_x.set(geometry.hand[0])
+        self.hand_y.set(geometry.hand[1])
+        self.newgame_x.set(geometry.newgame[0])
+        self.newgame_y.set(geometry.newgame[1])
+
+    def show_capture_status(self):
+        if self.worker.pending > 0:
+            self.info_text.set(f"Recognizing... ({self.worker.pending} queued)")
+
+    def on_capture(self, event: CaptureReady):
+        """show a finished capture, on the Tk thread"""
+        capture: Capture = event.capture
+        Screenshot.image = capture.image
+        Screenshot.bbox = capture.bbox
+        Screenshot.roi = capture.roi
+        self.last_capture = capture
+        if capture.geometry is not None:
+            self.set_geometry(capture.geometry)
+        self.ocr_result = capture.cards
+        self.preview = capture.preview
+        self.tk_previews = {}  # scaled from the previous screenshot
         try:
-            if Screenshot.select_image():
-                self.detect_cards()
-                self.render_canvas()
+            self.render_canvas()
         except Exception as e:
-            messagebox.showerror("Open File Failed", f"Error: {e}")
+            messagebox.showerror("Draw Error", f"Error: {e}")
             raise e
+        self.show_capture_status()
+
+    def on_capture_error(self, event: CaptureFailed):
+        messagebox.showerror("Capture Failed", f"Error: {event.error}")
+        self.show_capture_status()
 
     def redraw_canvas(self):
         try:
@@ -362,53 +903,76 @@ class Gui:
             messagebox.showerror("Draw Error", f"Error: {e}")
             raise e
 
+    def get_canvas_size(self):
+        return (self.canvas.winfo_width(), self.canvas.winfo_height())
+
     def get_fitted_size(self, wh: tuple[int, int]):
-        canvas_w = self.canvas.winfo_width()
-        canvas_h = self.canvas.winfo_height()
-        scale = min(canvas_w / wh[0], canvas_h / wh[1], 1)
-        return (int(wh[0] * scale), int(wh[1] * scale))
+        return Capture.fit_size(wh, self.get_canvas_size())
+
+    def get_layout(self):
+        """snapshot of the region settings for recognition threads"""
+        return Layout(
+            (
+                int(self.desk_left.get()),
+                int(self.desk_top.get()),
+                int(self.desk_right.get()),
+                int(self.desk_bottom.get()),
+            ),
+            int(self.card_ranks.get()),
+            (int(self.card_width.get()), int(self.card_height.get())),
+            (int(self.offset_x.get()), int(self.offset_y.get())),
+            int(self.ocr_n.get()),
+            (int(self.hand_x.get()), int(self.hand_y.get())),
+        )
 
     def render_canvas(self):
-        # clear canvas
-        self.canvas.delete("all")
-        self.ocr_canvas.delete("all")
-        self.ocr_tk_images = []
+        """Draw screenshot, overlays and OCR preview, redoing only what changed"""
+        self.redraw_id = None
         info = "(Resized to 1920x1080)"
         if Screenshot.image is None:
             self.info_text.set(info)
             return
         # keep w/h ratio and fit to canvas
-        new_size = self.get_fitted_size(Screenshot.image.size)
-        print(f"screen {Screenshot.image.size} -> {new_size}")
+        new_size = self.get_fitted_size(Screenshot.size())
         image_w, image_h = new_size
         scale_w, scale_h = image_w / 1920, image_h / 1080
-        self.tk_image = PhotoImage(Screenshot.transform(resize=new_size))
-        # render canvas
-        self.canvas.config(scrollregion=(0, 0, image_w, image_h))
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.tk_image)
-        self.canvas.create_rectangle(
-            int(self.desk_left.get()) * scale_w,
-            int(self.desk_top.get()) * scale_h,
-            int(self.desk_right.get()) * scale_w,
-            int(self.desk_bottom.get()) * scale_h,
+        self.render_preview(new_size)
+        # overlays are created once and moved afterwards
+        self.place_item(
+            "desk",
+            "rectangle",
+            (
+                int(self.desk_left.get()) * scale_w,
+                int(self.desk_top.get()) * scale_h,
+                int(self.desk_right.get()) * scale_w,
+                int(self.desk_bottom.get()) * scale_h,
+            ),
             outline="blue",
             width=1,
             fill="blue",
             stipple="gray12",
         )
-        self.canvas.create_oval(
-            (int(self.hand_x.get()) - 10) * scale_w,
-            (int(self.hand_y.get()) - 10) * scale_h,
-            (int(self.hand_x.get()) + 10) * scale_w,
-            (int(self.hand_y.get()) + 10) * scale_h,
+        self.place_item(
+            "hand",
+            "oval",
+            (
+                (int(self.hand_x.get()) - 10) * scale_w,
+                (int(self.hand_y.get()) - 10) * scale_h,
+                (int(self.hand_x.get()) + 10) * scale_w,
+                (int(self.hand_y.get()) + 10) * scale_h,
+            ),
             outline="purple",
             width=1.5,
         )
-        self.canvas.create_oval(
-            (int(self.newgame_x.get()) - 10) * scale_w,
-            (int(self.newgame_y.get()) - 10) * scale_h,
-            (int(self.newgame_x.get()) + 10) * scale_w,
-            (int(self.newgame_y.get()) + 10) * scale_h,
+        self.place_item(
+            "newgame",
+            "oval",
+            (
+                (int(self.newgame_x.get()) - 10) * scale_w,
+                (int(self.newgame_y.get()) - 10) * scale_h,
+                (int(self.newgame_x.get()) + 10) * scale_w,
+                (int(self.newgame_y.get()) + 10) * scale_h,
+            ),
             outline="aqua",
             width=1.5,
         )
@@ -428,81 +992,125 @@ class Gui:
         # show ocr part
         c = self.card_bbox(self.ocr_x.get(), self.ocr_y.get())
         c1 = self.bbox_scale(c, (scale_w, scale_h))
-        self.canvas.create_rectangle(
-            c1[0],
-            c1[1],
-            c1[2],
-            c1[3],
-            outline="red",
-            width=1,
-            fill="red",
-            stipple="gray25",
+        self.place_item(
+            "ocr", "rectangle", c1, outline="red", width=1, fill="red", stipple="gray25"
         )
-        print("ocr rect", c1, "scale", (scale_w, scale_h))
-        c2 = self.bbox_scale(c, Screenshot.scale())
-        n = int(self.ocr_n.get())
-        ocr_img = Screenshot.transform(crop=c2, resize=(n, n))
-        print("ocr image", c, "size", ocr_img.size)
 
         info = (
-            f"image(w={Screenshot.image.width},h={Screenshot.image.height}) "
+            f"image(w={Screenshot.size()[0]},h={Screenshot.size()[1]}) "
+            + f"roi{Screenshot.roi} "
             + f"margin(x={self.card_marginx()},y={self.card_marginy()}) "
             + f"ocr(x={c[0]},y={c[1]}) {info}"
         )
         self.info_text.set(info)
+        self.render_ocr(c)
 
-        # ocr result canvas
-        if self.ocr_result is not None:
-            for rank in range(len(self.ocr_result)):
-                x = rank * 30 + 10
-                for row in range(len(self.ocr_result[rank])):
-                    y = row * 20 + 10
-                    r = self.ocr_result[rank][row]
-                    self.ocr_canvas.create_text(
-                        x, y, text=r[1], fill="red" if r[0] else "black"
-                    )
+    def place_item(self, tag: str, kind: str, coords, **options):
+        """create canvas item `tag` on first use, later only move it"""
+        if self.canvas.find_withtag(tag):
+            self.canvas.coords(tag, *coords)
         else:
-            self.ocr_canvas.create_text(30, 10, text="Recognition failed")
+            getattr(self.canvas, f"create_{kind}")(*coords, tags=tag, **options)
+
+    def render_preview(self, fitted: tuple[int, int]):
+        """show the screenshot with the window scaled to fitted, in place of its
+        roi; scaled images are cached by size"""
+        size = Capture.preview_size(Screenshot.bbox, Screenshot.roi, fitted)
+        tk_image = self.tk_previews.get(size)
+        if tk_image is None:
+            if self.preview is None or self.preview.size != size:
+                print(f"screen {Screenshot.transform().size} -> {size}")
+                self.preview = Screenshot.transform(resize=size)  # canvas resized
+            tk_image = PhotoImage(self.preview)
+            self.tk_previews[size] = tk_image
+        if tk_image is self.tk_image:
+            return
+        self.tk_image = tk_image
+        self.canvas.config(scrollregion=(0, 0, fitted[0], fitted[1]))
+        w, h = Screenshot.size()
+        x = Screenshot.roi[0] * fitted[0] // w
+        y = Screenshot.roi[1] * fitted[1] // h
+        if self.canvas.find_withtag("screenshot"):
+            self.canvas.itemconfig("screenshot", image=tk_image)
+            self.canvas.coords("screenshot", x, y)
+        else:
+            self.canvas.create_image(
+                x, y, anchor=tk.NW, image=tk_image, tags="screenshot"
+            )
+            self.canvas.tag_lower("screenshot")
+
+    def render_ocr(self, c: Bbox):
+        """recognition result, the OCR crop and its distance to each template"""
+        if self.ocr_canvas_result is not self.ocr_result:
+            self.ocr_canvas_result = self.ocr_result
+            self.ocr_canvas.delete("result")
+            if self.ocr_result is not None:
+                for rank in range(len(self.ocr_result)):
+                    x = rank * 30 + 10
+                    for row in range(len(self.ocr_result[rank])):
+                        y = row * 20 + 10
+                        r = self.ocr_result[rank][row]
+                        color = "red" if r[0] else "black"
+                        self.ocr_canvas.create_text(
+                            x, y, text=r[1], fill=color, tags="result"
+                        )
+            else:
+                self.ocr_canvas.create_text(
+                    30, 10, text="Recognition failed", tags="result"
+                )
 
-        img_tk = PhotoImage(ocr_img)
-        self.ocr_tk_images.append(img_tk)
-        self.ocr_canvas.create_image(360, 10, image=img_tk)
+        if len(self.template_images) == 0:
+            # templates never change, built once
+            for i in range(len(CardBitmap.CARDS)):
+                x = i * 40 + 400
+                img_tk = PhotoImage(
+                    Image.frombytes(
+                        "L", (12, 12), CardBitmap.to_bytes(CardBitmap.CARDS[i]), "raw"
+                    )
+                )
+                self.template_images.append(img_tk)
+                self.ocr_canvas.create_image(x, 10, image=img_tk)
+                self.ocr_canvas.create_text(x, 30, tags=f"diff{i}")
+            self.ocr_canvas.create_image(360, 10, tags="crop")
+            self.ocr_canvas.create_text(360, 30, tags="face")
+
+        c2 = Screenshot.to_roi(self.bbox_scale(c, Screenshot.scale()))
+        n = int(self.ocr_n.get())
+        key = (id(Screenshot.image), c2, n)
+        if key == self.ocr_key:
+            return  # same crop, same match
+        self.ocr_key = key
+        ocr_img = Screenshot.transform(crop=c2, resize=(n, n))
+        print("ocr image", c, "size", ocr_img.size)
+        self.ocr_tk_images = [PhotoImage(ocr_img)]
+        self.ocr_canvas.itemconfig("crop", image=self.ocr_tk_images[0])
         blue: list[int] = ocr_img.get_flattened_data(2)  # pyright: ignore[reportAssignmentType]
         face, diffs = CardBitmap.compare(blue, n)
-        self.ocr_canvas.create_text(360, 30, text=f"={CardBitmap.NAMES[face]}")
+        self.ocr_canvas.itemconfig("face", text=f"={CardBitmap.NAMES[face]}")
         for i in range(len(diffs)):
-            x = i * 40 + 400
-            img_tk = PhotoImage(
-                Image.frombytes(
-                    "L", (12, 12), CardBitmap.to_bytes(CardBitmap.CARDS[i]), "raw"
-                )
-            )
-            self.ocr_tk_images.append(img_tk)
-            self.ocr_canvas.create_image(x, 10, image=img_tk)
-            self.ocr_canvas.create_text(x, 30, text=f"{diffs[i]:.1f}")
+            self.ocr_canvas.itemconfig(f"diff{i}", text=f"{diffs[i]:.1f}")
+
+    def schedule_redraw(self, *_):
+        """redraw once settings stop changing for redraw_ms"""
+        if self.redraw_id is not None:
+            self.root.after_cancel(self.redraw_id)
+        self.redraw_id = self.root.after(self.redraw_ms, self.redraw_later)
+
+    def redraw_later(self):
+        try:
+            self.render_canvas()
+        except (tk.TclError, ValueError, ZeroDivisionError):
+            self.redraw_id = None  # a setting is being typed, wait for the next one
 
     def card_marginx(self):
-        cw = int(self.card_width.get())
-        dw = int(self.desk_right.get()) - int(self.desk_left.get())
-        dn = int(self.card_ranks.get())
-        return (dw - cw) / (dn - 1) - cw
+        return self.get_layout().card_marginx()
 
     def card_marginy(self):
-        ch = int(self.card_height.get())
-        dh = int(self.desk_bottom.get()) - int(self.desk_top.get())
-        dn = math.ceil(36 / int(self.card_ranks.get()))  # 36 cards
-        return (dh - ch) / (dn - 1)
+        return self.get_layout().card_marginy()
 
     def card_bbox(self, x: int, y: int) -> Bbox:
         """resolution is (1920, 1080)"""
-        left = round(
-            x * (self.card_width.get() + self.card_marginx())
-            + self.desk_left.get()
-            + self.offset_x.get()
-        )
-        top = round(y * self.card_marginy() + self.desk_top.get() + self.offset_y.get())
-        n = int(self.ocr_n.get())
-        return (left, top, left + n, top + n)
+        return self.get_layout().card_bbox(x, y)
 
     @staticmethod
     def bbox_scale(bbox: Bbox, scale: tuple[float, float]) -> Bbox:
@@ -514,62 +1122,47 @@ class Gui:
             int(bbox[3] * scale[1]),
         )
 
-    def detect_cards(self):
-        if Screenshot.image is None:
-            return []
-        ranks = int(self.card_ranks.get())
-        dn = math.ceil(36 / ranks)  # 36 cards
-        n = int(self.ocr_n.get())  # n*n pixels
-        scale = Screenshot.scale()
-        result = []
-        for x in range(ranks):
-            stack: list[tuple[bool, str]] = []
-            for y in range(dn):
-                c2 = self.bbox_scale(self.card_bbox(x, y), scale)
-                img = Screenshot.transform(crop=c2, resize=(n, n))
-                red: list[int] = img.get_flattened_data(0)  # pyright: ignore[reportAssignmentType]
-                red_avg = sum(red) / len(red)
-                is_red = red_avg > 200
-                blue: list[int] = img.get_flattened_data(2)  # pyright: ignore[reportAssignmentType]
-                face, diffs = CardBitmap.compare(blue, n)
-                name = CardBitmap.NAMES[face]
-                print(
-                    f"card({x},{y}) red={red_avg:.2f}->{is_red} "
-                    + f"gray={sum(blue) / len(blue):.2f}->{name} {diffs}"
-                )
-                stack.append((is_red, name))
-            result.append(stack)
-        self.ocr_result: list[list[tuple[bool, str]]] = result
-        print(result)
-        return result
-
     @staticmethod
     def to_old_card(is_red: bool, face: str):
-        if face in ["6", "7", "8", "9"]:
-            return Card(face, "R" if is_red else "B")
-        elif face == "10":
-            return Card("0", "R" if is_red else "B")
-        else:
-            return Card("F", face[0])
+        return Card.from_face(is_red, face)
 
     def make_game(self):
-        if Screenshot.capture_window(self.window_name.get()):
-            self.detect_cards()
-            self.render_canvas()
-            ranks: list[Rank] = []
-            for i in range(len(self.ocr_result)):
-                cards: list[Card] = []
-                for r in self.ocr_result[i]:
-                    cards.append(self.to_old_card(*r))
-                ranks.append(Rank(i, Stack.from_cards(cards)))
-            return Game(ranks)
-        else:
-            raise Exception("Nothing captured")
+        """Capture and recognize a deal, called by the solving thread"""
+        game_metrics = self.board.metrics.current or GameMetrics(-1)
+        with game_metrics.stage("capture"):
+            # only the region of the cards, the layout is set up by now
+            window = Screenshot.locate_window(self.window_title)
+            image, bbox, roi = Screenshot.grab_window(*window, self.layout)
+
+        with game_metrics.stage("recognition"):
+            capture = self.recognize(
+                image, bbox, roi, self.layout, self.canvas_size, self.game_capture
+            )
+        self.game_capture = capture
+        # Screenshot and last_capture are updated by on_capture, on the Tk thread
+        self.bus.publish(CaptureReady(capture, from_job=False))
+        if self.board.recorder is not None:
+            boxes = self.layout.boxes(capture.bbox, capture.roi)
+            ocr_n = self.layout.ocr_n
+            self.board.deal_capture = DealCapture(capture.image, boxes, ocr_n)
+
+        ranks: list[Rank] = []
+        for i in range(len(capture.cards)):
+            cards: list[Card] = []
+            for r in capture.cards[i]:
+                cards.append(self.to_old_card(*r))
+            ranks.append(Rank(i, Stack.from_cards(cards)))
+        return Game(ranks)
 
     def update_board(self):
-        if not Screenshot.capture_window(self.window_name.get()):
+        """Snapshot the settings for the solving thread, on the Tk thread"""
+        self.window_title = self.window_name.get()
+        if not Screenshot.capture_window(self.window_title):
             raise Exception("Nothing captured")
         scale = Screenshot.scale()
+        self.layout = self.get_layout()
+        self.canvas_size = self.get_canvas_size()
+        self.game_capture = self.last_capture
 
         self.board.left_offset = Screenshot.bbox[0] + int(
             self.desk_left.get() * scale[0]
@@ -588,6 +1181,19 @@ class Gui:
         self.board.newgame_x = Screenshot.bbox[0] + int(self.newgame_x.get() * scale[0])
         self.board.newgame_y = Screenshot.bbox[1] + int(self.newgame_y.get() * scale[1])
 
+        budget = int(self.solve_budget.get())
+        self.board.solve_seconds = budget if budget > 0 else None
+        self.board.anytime = bool(self.solve_anytime.get())
+        hopeless = self.solve_hopeless.get()
+        self.board.predictor = Predictor() if hopeless != "solve" else None
+        self.board.hopeless_policy = hopeless
+        if not self.solve_record.get():
+            if self.board.recorder is not None:
+                self.board.recorder.close()
+            self.board.recorder = None
+        elif self.board.recorder is None:
+            self.board.recorder = SessionRecorder.create()
+
         self.solve_text.set(
             f"left={self.board.left_offset} top={self.board.top_offset} "
             f"hand=({self.board.hand_x},{self.board.hand_y}) "
@@ -596,54 +1202,93 @@ class Gui:
 
     def press_solve_stop(self):
         self.solve_stop = True
+        self.board.token.cancel()  # interrupts a running Game.solve
+
+    def show_progress(self, n):
+        """called by the solving thread after each game"""
+        summary = self.board.metrics.summary_line()
+        self.bus.publish(Progress(n, self.solve_total, summary))
+        return False
 
     def on_solve_complete(self, n):
-        self.solve_prog.config(value=n)
+        self.show_progress(n)
         if self.solve_stop:
-            self.solve_stop = False
             return True  # stop iteration
         return False
 
+    def on_progress(self, event: Progress):
+        self.solve_prog.config(value=event.done, maximum=max(event.total, 1))
+        self.solve_text.set(event.summary)
+
+    def on_run_finished(self, event: RunFinished):
+        if event.error is not None:
+            messagebox.showerror("Solve Error", f"Error: {event.error}")
+        elif event.stopped:
+            self.solve_text.set(f"Stopped after {event.done} games")
+
+    def run_games(self, play: Callable[[int], None]):
+        """body of the solving thread, reports to the UI only through the bus"""
+        self.bus.publish(Progress(0, self.solve_total))
+        try:
+            play(self.solve_total)
+        except Exception as e:
+            self.bus.publish(RunFinished(len(self.board.metrics.games), error=e))
+            raise e
+        done = len(self.board.metrics.games)
+        self.bus.publish(RunFinished(done, stopped=self.solve_stop))
+
     @staticmethod
     def solve_game_thread(inst):
-        n = int(inst.board_n.get())
-        inst.solve_prog.config(value=0, maximum=n)
-        inst.board.play_games(
-            n,
-            inst.make_game,
-            inst.on_solve_complete,
+        inst.run_games(
+            lambda n: inst.board.play_games(n, inst.make_game, inst.on_solve_complete)
         )
 
-    def solve_games(self):
+    def start_solve_thread(self, target):
+        """start solving unless the previous run is still going, never blocks"""
+        if self.solve_th is not None and self.solve_th.is_alive():
+            messagebox.showinfo("Busy", "Still solving, press Stop first")
+            return
         try:
-            if self.solve_th is not None:
-                self.solve_th.join(30)
             self.update_board()
-            self.solve_th = Thread(target=self.solve_game_thread, args=(self,))
+            self.solve_stop = False
+            self.solve_total = int(self.board_n.get())
+            self.board.token.reset()
+            self.solve_th = Thread(target=target, args=(self,), daemon=True)
             self.solve_th.start()
         except Exception as e:
             messagebox.showerror("Solve Error", f"Error: {e}")
             raise e
 
+    def solve_games(self):
+        self.start_solve_thread(self.solve_game_thread)
+
     @staticmethod
     def solve_quick_thread(inst):
-        n = int(inst.board_n.get())
-        inst.solve_prog.config(value=0, maximum=n)
-        inst.board.play_quick_games(
-            n,
-            lambda: inst.make_game(),
-            lambda k: inst.solve_prog.config(value=k),
+        inst.run_games(
+            lambda n: inst.board.play_quick_games(
+                n, inst.make_game, inst.on_solve_complete
+            )
         )
 
     def solve_games_quick(self):
+        self.start_solve_thread(self.solve_quick_thread)
+
+    def export_metrics(self):
+        """Save metrics of last solve run as JSON or CSV"""
+        file = filedialog.asksaveasfilename(
+            title="Export metrics",
+            filetypes=[("JSON", "*.json"), ("CSV", "*.csv")],
+            defaultextension=".json",
+        )
+        if not file:
+            return  # cancel
         try:
-            if self.solve_th is not None:
-                self.solve_th.join(30)
-            self.update_board()
-            self.solve_th = Thread(target=self.solve_quick_thread, args=(self,))
-            self.solve_th.start()
+            if file.lower().endswith(".csv"):
+                self.board.metrics.to_csv(file)
+            else:
+                self.board.metrics.to_json(file)
         except Exception as e:
-            messagebox.showerror("Solve Error", f"Error: {e}")
+            messagebox.showerror("Export Failed", f"Error: {e}")
             raise e
 
 
@@ -0,0 +1,140 @@
+import csv
+import json
+import time
+from contextlib import contextmanager
+from statistics import mean, stdev
+
+
+class GameMetrics:
+    """Per-stage timings of one game in Board.play_games, in seconds"""
+
+    STAGES = ["capture", "recognition", "solve", "execution", "newgame", "record"]
+    FIELDS = [
+        "game",
+        *STAGES,
+        "nodes",
+        "moves",
+        "prefix",
+        "predicted",
+        "hand",
+        "solved",
+        "aborted",
+    ]
+
+    def __init__(self, game: int):
+        self.game = game
+        self.capture = 0.0
+        self.recognition = 0.0
+        self.solve = 0.0
+        self.execution = 0.0
+        self.newgame = 0.0
+        self.record = 0.0  # writing Board.recorder
+        self.nodes = 0  # nodes expanded by Game.solve
+        self.moves = 0
+        self.prefix = 0  # moves played while solving, anytime mode
+        self.predicted = ""  # verdict of Board.predictor
+        self.hand = False  # solved with hand, may differ from the run's mode
+        self.solved = False
+        self.aborted = ""  # reason of giving up solving, see SolveBudget
+
+    @contextmanager
+    def stage(self, name: str):
+        """accumulate elapsed time of the block into stage `name`"""
+        start_time = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start_time
+            setattr(self, name, getattr(self, name) + elapsed)
+
+    def total(self):
+        return sum(getattr(self, s) for s in self.STAGES)
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+
+class PlayMetrics:
+    """Metrics of all games played by a Board"""
+
+    def __init__(self):
+        self.games: list[GameMetrics] = []
+        self.start_time = time.perf_counter()
+
+    def reset(self):
+        self.games = []
+        self.start_time = time.perf_counter()
+
+    def begin(self):
+        """start metrics of next game"""
+        game = GameMetrics(len(self.games))
+        self.games.append(game)
+        return game
+
+    @property
+    def current(self):
+        return self.games[-1] if len(self.games) > 0 else None
+
+    def completed(self):
+        return sum(1 for g in self.games if g.solved)
+
+    def failures(self):
+        return sum(1 for g in self.games if not g.solved)
+
+    def gave_up(self):
+        return sum(1 for g in self.games if g.aborted)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def games_per_hour(self):
+        elapsed = self.elapsed()
+        return self.completed() / elapsed * 3600 if elapsed > 0 else 0.0
+
+    def stage_means(self):
+        if len(self.games) == 0:
+            return {s: 0.0 for s in GameMetrics.STAGES}
+        return {s: mean(getattr(g, s) for g in self.games) for s in GameMetrics.STAGES}
+
+    def bottleneck(self):
+        means = self.stage_means()
+        return max(means, key=lambda s: means[s])
+
+    def summary_line(self):
+        """short text for progress display"""
+        means = self.stage_means()
+        stages = " ".join(f"{s}={means[s]:.2f}s" for s in GameMetrics.STAGES)
+        return (
+            f"{self.completed()} done, {self.failures()} failed "
+            + f"({self.gave_up()} gave up), "
+            + f"{self.games_per_hour():.0f} games/h | {stages}"
+        )
+
+    def summary(self):
+        solve = [g.solve for g in self.games if g.solved]
+        solve_mean = mean(solve) if len(solve) > 0 else 0.0
+        solve_std = stdev(solve) if len(solve) > 1 else 0.0
+        nodes = sum(g.nodes for g in self.games)
+        solve_total = sum(g.solve for g in self.games)
+        nps = nodes / solve_total if solve_total > 0 else 0.0
+        return (
+            f"{self.summary_line()}\n"
+            + f"solve {solve_mean:0.3f}s +/- {solve_std:0.3f}s, "
+            + f"{nodes} nodes ({nps:.0f}/s), bottleneck: {self.bottleneck()}"
+        )
+
+    def to_json(self, path: str):
+        data = {
+            "elapsed": self.elapsed(),
+            "games_per_hour": self.games_per_hour(),
+            "games": [g.to_dict() for g in self.games],
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    def to_csv(self, path: str):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=GameMetrics.FIELDS)
+            writer.writeheader()
+            for g in self.games:
+                writer.writerow(g.to_dict())
@@ -1,4 +1,6 @@
 class Move:
+    __slots__ = ("dest_rank_id", "from_rank_id")
+
     def __init__(self, dest_rank_id, from_rank_id):
         self.dest_rank_id = dest_rank_id
         self.from_rank_id = from_rank_id
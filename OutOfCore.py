@@ -0,0 +1,199 @@
+import argparse
+import heapq
+import os
+import random
+import tempfile
+import time
+from array import array
+
+from Budget import SolveBudget
+from Game import Game
+from Move import Move
+
+
+class OutOfCore:
+    """Breadth first search like Game.solve, with frontier and visited keys on disk.
+
+    Each BFS layer is a spill file of fixed size records: the state key and
+    its move list, one byte per move. Children are buffered up to run_size
+    records, sorted by key and spilled as runs. At the end of a layer the
+    runs are merged, dropping duplicates (delayed duplicate detection) and
+    keys of earlier layers, whose sorted key files are read sequentially
+    alongside the merge; the surviving keys are streamed to the key file of
+    the new layer. RAM holds one run, one block per key file and the current
+    move list, whatever the state space.
+    """
+
+    run_size = 1 << 16  # records buffered before a sorted run is spilled
+
+    def __init__(self, directory: str | None = None, run_size: int | None = None):
+        self.directory = directory  # for spill files, None = system temp dir
+        if run_size is not None:
+            self.run_size = run_size
+        self.disk_peak = 0  # bytes on disk at the end of the biggest layer
+
+    @staticmethod
+    def encode_move(move: Move):
+        return (move.from_rank_id + 1) * 10 + move.dest_rank_id + 1
+
+    @staticmethod
+    def decode_move(game: Game, byte: int):
+        return game.get_move(byte // 10 - 1, byte % 10 - 1)
+
+    def solve(self, game: Game, with_hand=False, budget: SolveBudget | None = None):
+        """Shortest move list to victory, None if unsolvable or out of budget.
+
+        Same result length as game.solve, game.nodes and game.aborted are set
+        alike. game is left at its dealt state.
+        """
+        game.check_hand = with_hand
+        game.aborted = None
+        if budget is not None:
+            budget.start()
+
+        with tempfile.TemporaryDirectory(dir=self.directory) as directory:
+            try:
+                return self.search(game, budget, directory)
+            finally:
+                game.walk_to([])  # back to the dealt state
+
+    def search(self, game: Game, budget, directory: str):
+        depth = 0
+        layer = os.path.join(directory, "layer-0")
+        with open(layer, "wb") as f:
+            f.write(game.key.to_bytes(8, "little"))
+        visited = [os.path.join(directory, "keys-0")]  # sorted key file per layer
+        with open(visited[0], "wb") as f:
+            f.write(game.key.to_bytes(8, "little"))
+
+        while os.path.getsize(layer) > 0:
+            runs = []
+            children = []
+            for _, move_bytes in self.read_records(layer, depth):
+                game.nodes += 1
+                move_list = [self.decode_move(game, b) for b in move_bytes]
+                game.walk_to(move_list)
+
+                if game.is_victory():
+                    return move_list
+
+                if budget is not None and game.nodes % budget.check_every == 0:
+                    game.aborted = budget.exceeded(game.nodes)
+                    if game.aborted is not None:
+                        return None
+
+                # as in Game.iterate, only the first move may go into the hand
+                to_hand = None if depth == 0 else False
+                moves = []
+                for rank in game.get_ranks(game.check_hand):
+                    moves += game.get_rank_moves(rank, to_hand)
+                for move in game.prune_moves(moves):
+                    child = move_bytes + bytes((self.encode_move(move),))
+                    children.append((game.get_move_key(move), child))
+
+                if len(children) >= self.run_size:
+                    runs.append(self.write_run(directory, len(runs), children))
+                    children = []
+            if len(children) > 0:
+                runs.append(self.write_run(directory, len(runs), children))
+
+            depth += 1
+            self.disk_peak = max(self.disk_peak, self.disk_usage(directory))
+            os.remove(layer)
+            layer = self.merge_runs(directory, depth, runs, visited)
+
+        return None
+
+    def write_run(self, directory: str, index: int, records: list):
+        records.sort()
+        path = os.path.join(directory, f"run-{index}")
+        with open(path, "wb") as f:
+            for key, move_bytes in records:
+                f.write(key.to_bytes(8, "little") + move_bytes)
+        return path
+
+    @staticmethod
+    def read_records(path: str, depth: int):
+        """(key, move bytes) of a layer or run file, in file order"""
+        size = 8 + depth
+        with open(path, "rb") as f:
+            while len(record := f.read(size)) == size:
+                yield int.from_bytes(record[:8], "little"), record[8:]
+
+    def merge_runs(self, directory: str, depth: int, runs: list, visited: list):
+        """Write the next layer and its key file from sorted runs, without the
+        keys of the key files in visited, and add its key file to visited"""
+        layer = os.path.join(directory, f"layer-{depth}")
+        keys_path = os.path.join(directory, f"keys-{depth}")
+        known = [self.read_keys(path) for path in visited]
+        fronts = [next(keys, None) for keys in known]
+        last_key = None
+        with open(layer, "wb") as f, open(keys_path, "wb") as keys_file:
+            merged = heapq.merge(*[self.read_records(run, depth) for run in runs])
+            for key, move_bytes in merged:
+                if key == last_key or self.is_visited(key, known, fronts):
+                    continue
+                last_key = key
+                key_bytes = key.to_bytes(8, "little")
+                keys_file.write(key_bytes)
+                f.write(key_bytes + move_bytes)
+        for keys in known:
+            keys.close()
+        for run in runs:
+            os.remove(run)
+
+        visited.append(keys_path)
+        return layer
+
+    def read_keys(self, path: str):
+        """Keys of a key file in file order, read run_size keys at a time"""
+        with open(path, "rb") as f:
+            while True:
+                block = array("Q")
+                try:
+                    block.fromfile(f, self.run_size)
+                except EOFError:  # the last block, block holds what was left
+                    yield from block
+                    return
+                yield from block
+
+    @staticmethod
+    def is_visited(key: int, known: list, fronts: list):
+        """Whether key is in one of the sorted key streams known, fronts are
+        their current keys; keys must be asked for in increasing order"""
+        for i, keys in enumerate(known):
+            while fronts[i] is not None and fronts[i] < key:
+                fronts[i] = next(keys, None)
+            if fronts[i] == key:
+                return True
+        return False
+
+    @staticmethod
+    def disk_usage(directory: str):
+        return sum(e.stat().st_size for e in os.scandir(directory))
+
+
+def main():
+    """Solve one deal out of core, proving it unsolvable if it is"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("seed", type=int, nargs="?", default=0)
+    parser.add_argument("--hand", action="store_true", help="solve with hand")
+    parser.add_argument("--dir", help="directory for spill files")
+    parser.add_argument("--run-size", type=int, help="records per sorted run")
+    args = parser.parse_args()
+
+    game = Game.deal(random.Random(args.seed))
+    search = OutOfCore(args.dir, args.run_size)
+    start_time = time.perf_counter()
+    moves = search.solve(game, args.hand)
+    elapsed = time.perf_counter() - start_time
+
+    result = "unsolvable" if moves is None else f"solved in {len(moves)} moves"
+    print(
+        f"deal {args.seed}: {result}, {game.nodes} nodes in {elapsed:.2f}s, "
+        + f"disk peak {search.disk_peak / 1e6:.1f}MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import random
+import sys
+import time
+
+from Budget import SolveBudget
+from Game import Game
+
+
+class Prediction:
+    """Result of Predictor.predict"""
+
+    SOLVABLE = "solvable"  # the probe found a solution
+    HOPELESS = "hopeless"  # likely unsolvable, may still be solvable
+
+    def __init__(self, verdict: str, features: dict, nodes: int, moves=None):
+        self.verdict = verdict
+        self.features = features
+        self.nodes = nodes  # nodes expanded by the probe
+        self.moves = moves  # probe solution, not the shortest
+
+    @property
+    def hopeless(self):
+        return self.verdict == self.HOPELESS
+
+    def __str__(self):
+        return f"{self.verdict} ({self.nodes} nodes) {self.features}"
+
+
+class Predictor:
+    """Flag deals that are likely unsolvable before the exhaustive Game.solve.
+
+    Static features catch dead deals instantly; otherwise a greedy depth first
+    probe looks for any solution within a node budget. Solvable deals almost
+    always give one up quickly, so failing the probe marks a deal hopeless.
+    """
+
+    probe_nodes = 6000
+
+    def __init__(self, probe_nodes: int | None = None):
+        if probe_nodes is not None:
+            self.probe_nodes = probe_nodes
+
+    @staticmethod
+    def features(game: Game, with_hand=False):
+        game.check_hand = with_hand
+        moves = game.get_moves()
+        combines = [m for m in moves if len(game.get_rank(m.dest_rank_id).stacks)]
+        return {
+            "moves": len(moves),
+            "combines": len(combines),
+            "empty": sum(1 for r in game.ranks if len(r.stacks) == 0),
+            "stacks": sum(len(r.stacks) for r in game.ranks),
+        }
+
+    @staticmethod
+    def move_score(game: Game, move):
+        """higher is tried first: completions, then combines, then emptying"""
+        score = 0
+        if game.is_completing_move(move):
+            score += 10
+        if len(game.get_rank(move.dest_rank_id).stacks) > 0:
+            score += 2
+        if len(game.get_rank(move.from_rank_id).stacks) == 1:
+            score += 1
+        return score
+
+    def probe(self, game: Game, with_hand=False):
+        """Greedy depth first search in place, return (moves or None, nodes)"""
+        hashes = {game.key}
+        nodes = 0
+        undo_list = []
+        # moves left to try at each depth, best at the end
+        stack = [self.sorted_moves(game, with_hand, None)]
+
+        while stack:
+            if len(stack[-1]) == 0:
+                stack.pop()
+                if len(undo_list) > 0:
+                    game.unmake_move(undo_list.pop())
+                continue
+
+            move = stack[-1].pop()
+            key = game.get_move_key(move)
+            if key in hashes:
+                continue
+            hashes.add(key)
+
+            undo_list.append(game.make_move(move))
+            if game.is_victory():
+                return [undo[0] for undo in undo_list], nodes
+            nodes += 1
+            if nodes > self.probe_nodes:
+                break
+            # same move generation as Game.iterate
+            stack.append(self.sorted_moves(game, with_hand, False))
+
+        return None, nodes
+
+    def sorted_moves(self, game: Game, with_hand, to_hand):
+        moves = []
+        for rank in game.get_ranks(with_hand):
+            moves += game.get_rank_moves(rank, to_hand)
+        moves.sort(key=lambda m: self.move_score(game, m))
+        return moves
+
+    def predict(self, game: Game, with_hand=False):
+        features = self.features(game.make_copy(), with_hand)
+        if features["moves"] == 0 and not game.is_victory():
+            return Prediction(Prediction.HOPELESS, features, 0)
+
+        root = game.make_copy()
+        root.check_hand = with_hand
+        moves, nodes = self.probe(root, with_hand)
+        if moves is None:
+            return Prediction(Prediction.HOPELESS, features, nodes)
+        return Prediction(Prediction.SOLVABLE, features, nodes, moves)
+
+
+def main():
+    """Measure false-skip rate on random deals: deals [seed] [--hand]"""
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    with_hand = "--hand" in sys.argv
+    rng = random.Random(seed)
+    predictor = Predictor()
+
+    solvable = skipped = false_skips = unknown = 0
+    predict_time = saved_time = 0.0
+    for i in range(n):
+        game = Game.deal(rng)
+        start_time = time.perf_counter()
+        prediction = predictor.predict(game, with_hand)
+        predict_time += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        truth = game.make_copy()
+        moves = truth.solve(with_hand, SolveBudget(seconds=120))
+        solve_time = time.perf_counter() - start_time
+        if truth.aborted is not None:
+            unknown += 1
+            continue
+
+        solvable += moves is not None
+        if prediction.hopeless:
+            skipped += 1
+            if moves is not None:
+                false_skips += 1
+                print(f"false skip #{i}: {prediction}")
+            else:
+                saved_time += solve_time
+
+    print(
+        f"{n} deals ({unknown} unknown), {solvable} solvable, {skipped} skipped, "
+        + f"false-skip rate {false_skips / max(solvable, 1):.1%} "
+        + f"({false_skips}/{solvable})\n"
+        + f"predict {predict_time / n * 1e3:.1f}ms/deal, "
+        + f"exhaustive search avoided {saved_time:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
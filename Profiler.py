@@ -0,0 +1,192 @@
+import argparse
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from Budget import SolveBudget
+from Game import Game
+
+
+class Sample:
+    """Solver counters at one on_sample call"""
+
+    def __init__(self, elapsed: float, game: Game):
+        self.elapsed = elapsed
+        self.nodes = game.nodes
+        self.duplicates = game.duplicates
+        self.frontier = game.move_stack_len
+        self.states = len(game.hashes)
+
+
+class Profiler:
+    """Counters, method timers and stack samples of one Game.solve.
+
+    Counters come from Game.on_sample and cost nothing between samples.
+    Timers wrap the hot Game methods only while timing() is active, and the
+    sampler reads the solving thread's stack from another thread, so
+    folded stacks for flame graphs don't slow the solver down.
+    """
+
+    TIMED = ["make_copy", "make_move", "unmake_move", "hash", "get_rank_moves"]
+    TIMED += ["get_move_key", "is_victory"]
+
+    interval = 0.001  # seconds between two stack samples
+
+    def __init__(self, interval: float | None = None):
+        if interval is not None:
+            self.interval = interval
+        self.samples: list[Sample] = []
+        self.times: dict[str, float] = {name: 0.0 for name in self.TIMED}
+        self.calls: dict[str, int] = {name: 0 for name in self.TIMED}
+        self.stacks: Counter[str] = Counter()  # folded stack -> samples
+        self.start_time = time.perf_counter()
+        self.cprofile: cProfile.Profile | None = None
+
+    def attach(self, game: Game):
+        """Collect counters of game every Game.sample_every nodes"""
+        self.start_time = time.perf_counter()
+        game.on_sample = self.sample
+
+    def sample(self, game: Game):
+        self.samples.append(Sample(time.perf_counter() - self.start_time, game))
+
+    @contextmanager
+    def timing(self):
+        """Accumulate time spent in the TIMED methods of Game"""
+        originals = {name: getattr(Game, name) for name in self.TIMED}
+
+        def timed(name, method):
+            def wrapper(*args, **kwargs):
+                start_time = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    self.times[name] += time.perf_counter() - start_time
+                    self.calls[name] += 1
+
+            return wrapper
+
+        for name, method in originals.items():
+            setattr(Game, name, timed(name, method))
+        try:
+            yield self
+        finally:
+            for name, method in originals.items():
+                setattr(Game, name, method)
+
+    @contextmanager
+    def sampling(self):
+        """Sample the stack of the calling thread every interval seconds"""
+        thread_id = threading.get_ident()
+        done = threading.Event()
+
+        def run():
+            while not done.wait(self.interval):
+                frame = sys._current_frames().get(thread_id)
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    file = os.path.basename(code.co_filename)
+                    names.append(f"{code.co_name} ({file}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+        sampler = threading.Thread(target=run, daemon=True)
+        sampler.start()
+        try:
+            yield self
+        finally:
+            done.set()
+            sampler.join()
+
+    def run(
+        self,
+        game: Game,
+        with_hand=False,
+        budget: SolveBudget | None = None,
+        timers=False,
+        cprofile=False,
+    ):
+        """game.solve with counters and stack samples, timers and cProfile on demand"""
+        self.attach(game)
+        with self.sampling():
+            if cprofile:
+                self.cprofile = cProfile.Profile()
+                self.cprofile.enable()
+            try:
+                if timers:
+                    with self.timing():
+                        moves = game.solve(with_hand, budget)
+                else:
+                    moves = game.solve(with_hand, budget)
+            finally:
+                if self.cprofile is not None:
+                    self.cprofile.disable()
+        self.sample(game)
+        return moves
+
+    def nodes_per_second(self):
+        if len(self.samples) == 0 or self.samples[-1].elapsed == 0:
+            return 0.0
+        return self.samples[-1].nodes / self.samples[-1].elapsed
+
+    def summary(self):
+        if len(self.samples) == 0:
+            return "no samples"
+        last = self.samples[-1]
+        peak = max(s.frontier for s in self.samples)
+        lines = [
+            f"{last.nodes} nodes in {last.elapsed:.2f}s "
+            + f"({self.nodes_per_second():.0f}/s), {last.states} states, "
+            + f"{last.duplicates} duplicates, frontier peak {peak}"
+        ]
+        for name in sorted(self.TIMED, key=lambda n: -self.times[n]):
+            if self.calls[name] > 0:
+                per_call = self.times[name] / self.calls[name] * 1e6
+                lines.append(
+                    f"  {name}: {self.times[name]:.3f}s "
+                    + f"({self.calls[name]} calls, {per_call:.2f}us)"
+                )
+        return "\n".join(lines)
+
+    def write_folded(self, path: str):
+        """Folded stacks, input of flamegraph.pl, inferno or speedscope"""
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def write_pstats(self, path: str):
+        """cProfile stats for pstats or snakeviz, needs run(cprofile=True)"""
+        if self.cprofile is None:
+            raise ValueError("no cProfile data, use run(cprofile=True)")
+        self.cprofile.dump_stats(path)
+
+
+def main():
+    """Profile Game.solve on one random deal"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("seed", type=int, nargs="?", default=0)
+    parser.add_argument("--hand", action="store_true", help="solve with hand")
+    parser.add_argument("--timers", action="store_true", help="time Game methods")
+    parser.add_argument("--folded", help="save folded stacks for a flame graph")
+    parser.add_argument("--pstats", help="save cProfile stats")
+    args = parser.parse_args()
+
+    game = Game.deal(random.Random(args.seed))
+    profiler = Profiler()
+    moves = profiler.run(game, args.hand, None, args.timers, args.pstats is not None)
+    print(f"deal {args.seed}: {'unsolvable' if moves is None else len(moves)}")
+    print(profiler.summary())
+    if args.folded is not None:
+        profiler.write_folded(args.folded)
+    if args.pstats is not None:
+        profiler.write_pstats(args.pstats)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,40 @@
+from Zobrist import Zobrist
+
+
 class Rank:
-    def __init__(self, rank, stacks):
+    __slots__ = ("rank", "stacks", "cards", "key")
+
+    def __init__(self, rank, stacks, key=None):
         self.rank = rank
         self.stacks = stacks
+        self.cards = sum(stack.length for stack in stacks)  # kept up to date
+
+        # Zobrist key, kept up to date by push_stack/pop_stack
+        if key is None:
+            key = 0
+            for depth in range(len(self.stacks)):
+                key ^= self.get_stack_key(depth, self.stacks[depth])
+        self.key = key
+
+    def get_stack_key(self, depth, stack):
+        """key of stack at depth of this rank, see Zobrist"""
+        return Zobrist.stack_key(Zobrist.HAND if self.rank == -1 else depth, stack)
+
+    def push_stack(self, stack):
+        depth = Zobrist.HAND if self.rank == -1 else len(self.stacks)
+        self.key ^= stack.keys[depth]
+        self.cards += stack.length
+        self.stacks.append(stack)
+
+    def pop_stack(self):
+        stack = self.stacks.pop(-1)
+        depth = Zobrist.HAND if self.rank == -1 else len(self.stacks)
+        self.key ^= stack.keys[depth]
+        self.cards -= stack.length
+        return stack
 
     def remove_top_stack(self):
-        self.stacks.pop(-1)
+        self.pop_stack()
 
     def get_top_stack(self):
         return self.stacks[-1]
@@ -12,24 +42,16 @@ class Rank:
     def get_output(self):
         out_arr = []
         for stack in self.stacks:
-            out_arr.push(stack.get_output())
+            out_arr.append(stack.get_output())
 
         return out_arr
 
     def make_copy(self):
-        new_stacks = []
-
-        for stack in self.stacks:
-            new_stacks.append(stack.make_copy())
-
-        return Rank(self.rank, new_stacks)
+        # stacks are immutable, so the copy shares them
+        return Rank(self.rank, list(self.stacks), self.key)
 
     def get_total_cards(self):
-        cards = 0
-        for stack in self.stacks:
-            cards += stack.length
-
-        return cards
+        return self.cards
 
     def hash(self):
         out_str = ""
@@ -0,0 +1,205 @@
+import argparse
+import io
+import json
+import os
+import struct
+import time
+
+from Backend import Bbox
+from Budget import SolveBudget
+from Card import Card, CardBitmap
+from Game import Game
+from Metrics import GameMetrics
+from Move import Move
+
+SESSIONS = r"sessions/"
+
+
+class DealCapture:
+    """Pixels a deal was recognized from: one image and its card boxes"""
+
+    def __init__(self, image, boxes: list[list[Bbox]], ocr_n=0):
+        self.image = image  # PIL image, only the board region
+        self.boxes = boxes  # rank by rank, in image pixels
+        self.ocr_n = ocr_n  # boxes resized to n*n for CardBitmap, 0 for Board.get_card
+
+    @staticmethod
+    def from_crops(crops: list[list]):
+        """sheet of card boxes grabbed one by one, rank by rank"""
+        from PIL import Image
+
+        w = max(crop.width for rank in crops for crop in rank)
+        h = max(crop.height for rank in crops for crop in rank)
+        rows = max(len(rank) for rank in crops)
+        sheet = Image.new("RGB", (w * len(crops), h * rows))
+        boxes: list[list[Bbox]] = []
+        for x in range(len(crops)):
+            boxes.append([])
+            for y in range(len(crops[x])):
+                crop = crops[x][y]
+                sheet.paste(crop, (x * w, y * h))
+                boxes[x].append((x * w, y * h, x * w + crop.width, y * h + crop.height))
+        return DealCapture(sheet, boxes)
+
+    def recognize(self):
+        """cards in the boxes, as recognized while playing"""
+        from PIL import Image
+
+        from Board import Board
+
+        ranks: list[list[Card]] = []
+        for boxes in self.boxes:
+            ranks.append([])
+            for box in boxes:
+                crop = self.image.crop(box)
+                n = self.ocr_n
+                if n == 0:
+                    ranks[-1].append(Board.get_card(crop))
+                    continue
+                if crop.size != (n, n):
+                    crop = crop.resize((n, n), Image.Resampling.LANCZOS)
+                is_red, name, _ = CardBitmap.recognize(crop, n)
+                ranks[-1].append(Card.from_face(is_red, name))
+        return ranks
+
+
+class SessionRecorder:
+    """Append-only log of a Board session: deals, their pixels, moves, timings.
+
+    A record is a (header length, blob length) pair of little-endian uint32,
+    a JSON header and a blob, the PNG of the deal's board region. Records are
+    flushed as they are written, so a session is readable while it grows and
+    after a crash, up to its last complete record.
+    """
+
+    RECORD = struct.Struct("<II")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "ab")
+
+    @staticmethod
+    def create(directory: str = SESSIONS):
+        """recorder of a new session file named by the current time"""
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime("%Y%m%d-%H%M%S")
+        return SessionRecorder(os.path.join(directory, f"{name}.session"))
+
+    def write(self, header: dict, blob=b""):
+        header["time"] = time.time()
+        data = json.dumps(header, separators=(",", ":")).encode()
+        self.file.write(self.RECORD.pack(len(data), len(blob)) + data + blob)
+        self.file.flush()
+
+    def deal(self, game: Game, with_hand: bool, capture: DealCapture | None):
+        header: dict = {"type": "deal", "ranks": get_ids(game), "with_hand": with_hand}
+        blob = b""
+        if capture is not None:
+            out = io.BytesIO()
+            capture.image.save(out, "PNG")
+            blob = out.getvalue()
+            header["boxes"] = capture.boxes
+            header["ocr_n"] = capture.ocr_n
+        self.write(header, blob)
+
+    def result(self, moves: list[Move] | None, metrics: GameMetrics):
+        pairs = None
+        if moves is not None:
+            pairs = [[m.from_rank_id, m.dest_rank_id] for m in moves]
+        self.write({"type": "result", "moves": pairs, "metrics": metrics.to_dict()})
+
+    def close(self):
+        self.file.close()
+
+
+def get_ids(game: Game):
+    """card ids of each rank from back to front"""
+    return [[id for s in rank.stacks for id in s.get_output()] for rank in game.ranks]
+
+
+def read_session(path: str):
+    """(header, blob) of each complete record of a session file"""
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(SessionRecorder.RECORD.size)
+            if len(head) < SessionRecorder.RECORD.size:
+                return
+            header_len, blob_len = SessionRecorder.RECORD.unpack(head)
+            data = f.read(header_len)
+            blob = f.read(blob_len)
+            if len(data) < header_len or len(blob) < blob_len:
+                return  # cut by a crash
+            yield json.loads(data), blob
+
+
+def replay(path: str, solve=True, seconds: float | None = None):
+    """Run the deals of a session through recognition and solving again.
+
+    Return (deals, recognition mismatches, solution length changes).
+    """
+    from PIL import Image
+
+    deals = mismatches = changed = 0
+    recognition_time = solve_time = 0.0
+    recorded: dict = {}
+    game: Game | None = None
+    for header, blob in read_session(path):
+        if header["type"] == "deal":
+            deals += 1
+            columns = [[Card(id[0], id[1]) for id in ids] for ids in header["ranks"]]
+            game = Game.from_cards(columns)
+            recorded = header
+            if len(blob) > 0:
+                image = Image.open(io.BytesIO(blob))
+                boxes, ocr_n = header["boxes"], header["ocr_n"]
+                capture = DealCapture(image.convert("RGB"), boxes, ocr_n)
+                start_time = time.perf_counter()
+                cards = capture.recognize()
+                recognition_time += time.perf_counter() - start_time
+                if Game.from_cards(cards).key != game.key:
+                    mismatches += 1
+                    ids = [[card.id for card in rank] for rank in cards]
+                    print(f"deal {deals}: recognized {ids}, recorded {header['ranks']}")
+        elif header["type"] == "result" and game is not None:
+            if not solve:
+                continue
+            budget = None if seconds is None else SolveBudget(seconds=seconds)
+            # the mode solved in, the predictor may have switched to hand
+            with_hand = header["metrics"].get("hand", recorded["with_hand"])
+            start_time = time.perf_counter()
+            moves = game.solve(with_hand, budget)
+            elapsed = time.perf_counter() - start_time
+            solve_time += elapsed
+            length = None if moves is None else len(moves)
+            before = None if header["moves"] is None else len(header["moves"])
+            if length != before:
+                changed += 1
+            metrics = header["metrics"]
+            print(
+                f"deal {deals}: {length} moves, {game.nodes} nodes in {elapsed:.3f}s; "
+                + f"recorded {before} moves, {metrics['nodes']} nodes "
+                + f"in {metrics['solve']:.3f}s"
+            )
+            game = None
+    print(
+        f"{deals} deals, recognition {recognition_time:.3f}s "
+        + f"({mismatches} mismatches), solve {solve_time:.3f}s ({changed} changed)"
+    )
+    return deals, mismatches, changed
+
+
+def main():
+    """Replay recorded sessions through recognition and solving"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("sessions", nargs="+")
+    parser.add_argument("--no-solve", action="store_true", help="recognition only")
+    parser.add_argument("--seconds", type=float, help="solve budget per deal")
+    args = parser.parse_args()
+
+    for path in args.sessions:
+        print(path)
+        replay(path, not args.no_solve, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
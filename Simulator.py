@@ -0,0 +1,257 @@
+import argparse
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+from Backend import Backend, Bbox
+from Board import Board
+from Card import CardBitmap
+from Corpus import Corpus
+from Daemon import DAEMON_SOCKET, SolverClient
+from Game import Game
+from Move import Move
+from OutOfCore import OutOfCore
+from Predictor import Predictor
+from Session import SessionRecorder
+from Stack import Stack
+
+
+class SimulatedTable(Backend):
+    """In-process ПАСЬЯНС table, rendered from CardBitmap and played by drags"""
+
+    width = 1920
+    height = 1080
+    card_height = 180
+
+    background = (30, 30, 30)
+    card_color = (255, 255, 255)
+    button_color = (90, 90, 90)
+
+    def __init__(self, seed: int | None = None, board=Board, corpus=None):
+        self.rng = random.Random(seed)
+        self.board = board  # geometry, Board class or instance
+        self.corpus: Corpus | None = corpus  # deals in its order instead of random
+
+        self.glyphs = {}
+        for name, bitmap in zip(CardBitmap.NAMES, CardBitmap.CARDS):
+            gray = Image.frombytes("L", (12, 12), CardBitmap.to_bytes(bitmap), "raw")
+            white = Image.new("L", gray.size, 255)
+            self.glyphs[(False, name)] = Image.merge("RGB", (gray, gray, gray))
+            self.glyphs[(True, name)] = Image.merge("RGB", (white, gray, gray))
+
+        self.pos = (0.0, 0.0)
+        self.press: tuple[float, float] | None = None
+        self.frame: Image.Image | None = None
+
+        self.games_dealt = 0
+        self.games_won = 0
+        self.moves = 0
+        self.illegal_moves = 0
+        self.idle_time = 0.0  # mouse durations and sleeps, not really waited
+
+        self.game = self.deal()
+
+    def deal(self):
+        self.games_dealt += 1
+        self.frame = None
+        if self.corpus is not None:
+            return self.corpus.get_game((self.games_dealt - 1) % len(self.corpus))
+        return Game.deal(self.rng)
+
+    # Backend
+
+    def move_to(self, x: float, y: float, duration: float = 0.0):
+        self.pos = (x, y)
+        self.idle_time += duration
+
+    def mouse_down(self, x: float | None = None, y: float | None = None):
+        if x is not None and y is not None:
+            self.pos = (x, y)
+        self.press = self.pos
+
+    def mouse_up(self):
+        if self.press is None:
+            return
+        press, self.press = self.press, None
+        if self.is_newgame(*press) and self.is_newgame(*self.pos):
+            self.game = self.deal()
+            return
+        from_id = self.get_source(*press)
+        dest_id = self.get_target(*self.pos)
+        if from_id is None or dest_id is None or from_id == dest_id:
+            return
+        self.drop(from_id, dest_id)
+
+    def grab(self, bbox: Bbox | None = None) -> Image.Image:
+        if self.frame is None:
+            self.frame = self.render()
+        if bbox is None:
+            return self.frame.copy()
+        return self.frame.crop(bbox)
+
+    def sleep(self, secs: float):
+        self.idle_time += secs
+
+    # table
+
+    def get_rank_at(self, x: float, y: float):
+        """rank id under the point, -1 for hand, None for nothing"""
+        b = self.board
+        if abs(x - b.hand_x) < b.card_width / 2 and abs(y - b.hand_y) < 40:
+            return -1
+        rank = int((x - b.left_offset) // b.horizontal_spacing)
+        if x < b.left_offset or rank >= len(self.game.ranks):
+            return None
+        if x - b.left_offset - rank * b.horizontal_spacing > b.card_width:
+            return None  # margin between ranks
+        if y < b.top_offset - b.vertical_spacing:
+            return None  # above the card slot
+        return rank
+
+    def get_source(self, x: float, y: float):
+        """rank id if the point picks up exactly the top stack"""
+        rank_id = self.get_rank_at(x, y)
+        if rank_id is None:
+            return None
+        rank = self.game.get_rank(rank_id)
+        if len(rank.stacks) == 0:
+            return None
+        if rank_id == -1:
+            return rank_id
+        total = rank.get_total_cards()
+        card_idx = int((y - self.board.top_offset) // self.board.vertical_spacing)
+        if min(card_idx, total - 1) != total - rank.get_top_stack().length:
+            self.illegal_moves += 1  # picked inside or below the top stack
+            return None
+        return rank_id
+
+    def get_target(self, x: float, y: float):
+        return self.get_rank_at(x, y)
+
+    def is_newgame(self, x: float, y: float):
+        b = self.board
+        return abs(x - b.newgame_x) < 40 and abs(y - b.newgame_y) < 20
+
+    def drop(self, from_id: int, dest_id: int):
+        from_rank = self.game.get_rank(from_id)
+        dest_rank = self.game.get_rank(dest_id)
+        stack = from_rank.get_top_stack()
+        if dest_id == -1:
+            legal = len(dest_rank.stacks) == 0 and stack.length == 1
+        elif len(dest_rank.stacks) == 0:
+            legal = True
+        else:
+            legal = Stack.can_combine(stack, dest_rank.get_top_stack())
+        if not legal:
+            self.illegal_moves += 1
+            return
+        self.game.make_move(Move(dest_id, from_id))
+        self.moves += 1
+        self.frame = None
+        if self.game.is_victory():
+            self.games_won += 1
+
+    def render(self):
+        b = self.board
+        image = Image.new("RGB", (self.width, self.height), self.background)
+        draw = ImageDraw.Draw(image)
+        for rank in self.game.ranks:
+            x = b.left_offset + rank.rank * b.horizontal_spacing
+            cards = [c for stack in rank.stacks for c in stack.get_output()]
+            for row, card_id in enumerate(cards):
+                y = b.top_offset + row * b.vertical_spacing
+                self.render_card(draw, image, card_id, x, y)
+        for stack in self.game.hand.stacks:
+            x = b.hand_x - b.card_width / 2
+            y = b.hand_y - b.vertical_spacing
+            self.render_card(draw, image, str(stack.back), x, y)
+        draw.rectangle(
+            (b.newgame_x - 40, b.newgame_y - 20, b.newgame_x + 40, b.newgame_y + 20),
+            fill=self.button_color,
+        )
+        return image
+
+    def render_card(self, draw, image, card_id: str, x: float, y: float):
+        x, y = int(x), int(y)
+        draw.rectangle(
+            (x, y, x + self.board.card_width, y + self.card_height),
+            fill=self.card_color,
+            outline=self.background,
+        )
+        if card_id[0] == "F":
+            key = (card_id[1] in "DH", card_id[1])
+        else:
+            key = (card_id[1] == "R", "10" if card_id[0] == "0" else card_id[0])
+        image.paste(self.glyphs[key], (x + 1, y + 1))
+
+    def summary(self, elapsed: float, completed: int):
+        real = elapsed + self.idle_time
+        return (
+            f"{completed} games in {elapsed:.2f}s: "
+            + f"{completed / elapsed * 60:.1f} games/min headless, "
+            + f"{completed / real * 60:.1f} games/min with delays "
+            + f"(dealt={self.games_dealt} won={self.games_won} "
+            + f"moves={self.moves} illegal={self.illegal_moves})"
+        )
+
+
+def main():
+    """Benchmark Board.play_games end to end on a simulated table"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("games", type=int, nargs="?", default=10)
+    parser.add_argument("seed", type=int, nargs="?", default=0)
+    parser.add_argument("--quick", action="store_true", help="solve without hand")
+    parser.add_argument("--anytime", action="store_true", help="play while solving")
+    parser.add_argument("--decompose", action="store_true", help="solve in stages")
+    parser.add_argument("--out-of-core", action="store_true", help="search on disk")
+    parser.add_argument(
+        "--predict",
+        choices=["hand", "skip"],
+        help="check deals first, solve hopeless ones with hand or skip them",
+    )
+    parser.add_argument("--export", help="save metrics to .json or .csv")
+    parser.add_argument("--record", help="log the session for Session.py replay")
+    parser.add_argument("--corpus", help="play the deals of a Corpus.py file")
+    parser.add_argument(
+        "--daemon",
+        nargs="?",
+        const=DAEMON_SOCKET,
+        metavar="SOCKET",
+        help="solve in a running Daemon.py",
+    )
+    args = parser.parse_args()
+
+    corpus = None if args.corpus is None else Corpus.load(args.corpus)
+    table = SimulatedTable(args.seed, corpus=corpus)
+    board = Board(table)
+    board.anytime = args.anytime
+    board.decompose = args.decompose
+    if args.out_of_core:
+        board.out_of_core = OutOfCore()
+    if args.predict is not None:
+        board.predictor = Predictor()
+        board.hopeless_policy = args.predict
+    if args.record is not None:
+        board.recorder = SessionRecorder(args.record)
+    if args.daemon is not None:
+        board.daemon = SolverClient(args.daemon)
+    start_time = time.time()
+    if args.quick:
+        board.play_quick_games(args.games, None, None)
+    else:
+        board.play_games(args.games, None, None)
+    completed = board.metrics.completed()
+    print(table.summary(time.time() - start_time, completed))
+    if args.export is not None:
+        if args.export.endswith(".csv"):
+            board.metrics.to_csv(args.export)
+        else:
+            board.metrics.to_json(args.export)
+    if table.games_won != completed or table.illegal_moves > 0:
+        sys.exit(1)  # solver, recognition or Board geometry regressed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import random
+import sys
+import time
+
+from Budget import SolveBudget
+from Card import Card
+from Game import Game
+
+# display, capture and input stacks the solver must never pull in
+GUI_MODULES = ["tkinter", "PIL", "pyautogui", "ttkthemes"]
+
+
+def parse_deal(text: str):
+    """Game from 9 lines of card ids, back to front, e.g. "0R 9B FC 6R" """
+    columns = []
+    for line in text.splitlines():
+        if line.strip() == "":
+            continue
+        ids = line.split()
+        for id in ids:
+            if id not in Card.index_lookup:
+                raise ValueError(f"unknown card {id}")
+        columns.append([Card(id[0], id[1]) for id in ids])
+    if len(columns) != 9:
+        raise ValueError(f"a deal has 9 ranks, got {len(columns)}")
+    return Game.from_cards(columns)
+
+
+def solve(game: Game, with_hand=False, budget: SolveBudget | None = None):
+    """Moves as (from rank id, dest rank id), hand is -1, None if unsolvable"""
+    moves = game.solve(with_hand, budget)
+    if moves is None:
+        return None
+    return [(move.from_rank_id, move.dest_rank_id) for move in moves]
+
+
+def import_time(module: str, repeat=5):
+    """Best wall time of importing module in a fresh interpreter, and the
+    GUI_MODULES it loaded; (None, error) when the import fails"""
+    import subprocess  # only the benchmark spawns interpreters
+
+    code = (
+        "import sys, time\n"
+        + "start = time.perf_counter()\n"
+        + f"import {module}\n"
+        + "print(time.perf_counter() - start)\n"
+        + f"print(' '.join(m for m in {GUI_MODULES!r} if m in sys.modules))\n"
+    )
+    best = None
+    loaded = ""
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        lines = result.stdout.splitlines()
+        seconds = float(lines[-2])
+        loaded = lines[-1]
+        best = seconds if best is None else min(best, seconds)
+    return best, loaded
+
+
+def main():
+    """Solve one deal without any GUI, capture or input module"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("seed", type=int, nargs="?", default=0, help="random deal")
+    parser.add_argument("--deal", help="deal file, 9 lines of card ids, - for stdin")
+    parser.add_argument("--hand", action="store_true", help="solve with hand")
+    parser.add_argument("--seconds", type=float, help="give up after seconds")
+    parser.add_argument(
+        "--imports",
+        nargs="*",
+        metavar="MODULE",
+        help="benchmark import time of modules instead (default: entry points)",
+    )
+    args = parser.parse_args()
+
+    if args.imports is not None:
+        modules = args.imports or ["Solver", "Game", "Board", "Simulator", "Gui"]
+        for module in modules:
+            seconds, loaded = import_time(module)
+            if seconds is None:
+                print(f"{module:>10}: unavailable ({loaded})")
+            else:
+                print(f"{module:>10}: {seconds * 1e3:7.1f}ms  {loaded}")
+        return
+
+    if args.deal is None:
+        game = Game.deal(random.Random(args.seed))
+    elif args.deal == "-":
+        game = parse_deal(sys.stdin.read())
+    else:
+        with open(args.deal) as f:
+            game = parse_deal(f.read())
+
+    budget = None if args.seconds is None else SolveBudget(seconds=args.seconds)
+    start_time = time.perf_counter()
+    moves = solve(game, args.hand, budget)
+    elapsed = time.perf_counter() - start_time
+    if moves is None:
+        reason = "aborted" if game.aborted is not None else "unsolvable"
+        print(f"{reason} after {game.nodes} nodes, {elapsed:.2f}s")
+        sys.exit(1)
+    for from_rank_id, dest_rank_id in moves:
+        print(f"{from_rank_id} -> {dest_rank_id}")
+    print(f"{len(moves)} moves, {game.nodes} nodes, {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
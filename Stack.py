@@ -1,4 +1,12 @@
+from Card import Card
+from Zobrist import Zobrist
+
+
 class Stack:
+    """Immutable, shared: Stack(back, front, length) returns a cached object"""
+
+    __slots__ = ("back", "front", "length", "is_faces", "keys")
+
     numb_lookup = {"0": None, "9": "0", "8": "9", "7": "8", "6": "7"}
     value_lookup = {
         "0": 10,
@@ -11,6 +19,14 @@ class Stack:
 
     @staticmethod
     def get_combine(from_stack, to_stack):
+        if not Stack.combine_table[from_stack.back.index][to_stack.front.index]:
+            return None
+        length = to_stack.length + from_stack.length
+        return Stack(to_stack.back, from_stack.front, length)
+
+    @staticmethod
+    def check_combine(from_stack, to_stack):
+        """Rules of get_combine, used to fill combine_table"""
         if from_stack.is_faces and to_stack.is_faces:
             suit_match = from_stack.back.suit == to_stack.front.suit
             if suit_match:
@@ -38,6 +54,15 @@ class Stack:
         else:
             return None
 
+    # combine_table[back.index][front.index]: a stack with this back card can
+    # go onto a stack with this front card, see build_combine_table
+    combine_table: list[list[bool]] = []
+
+    @staticmethod
+    def can_combine(from_stack, to_stack):
+        """Same as get_combine() is not None, without building the new stack"""
+        return Stack.combine_table[from_stack.back.index][to_stack.front.index]
+
     @staticmethod
     def from_cards(cards):
         stacks = []
@@ -67,30 +92,67 @@ class Stack:
 
         return stacks
 
-    def __init__(self, back, front, length):
-        self.back = back
-        self.front = front
-        self.length = length
+    stacks: dict[tuple, "Stack"] = {}
+
+    def __new__(cls, back, front, length):
+        stack = cls.stacks.get((back, front, length))
+        if stack is None:
+            stack = super().__new__(cls)
+            object.__setattr__(stack, "back", back)
+            object.__setattr__(stack, "front", front)
+            object.__setattr__(stack, "length", length)
+            object.__setattr__(stack, "is_faces", back.value == "F")
+            # Zobrist keys at every depth, see Zobrist.get_keys
+            object.__setattr__(stack, "keys", Zobrist.get_keys(back.id, front.id))
+            cls.stacks[(back, front, length)] = stack
+        return stack
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Stack is immutable, can't set {name}")
 
-        self.is_faces = self.back.value == "F"
+    def __reduce__(self):
+        return Stack, (self.back, self.front, self.length)
 
     def __str__(self):
         return str(self.back) + ":" + str(self.front)
 
     def make_copy(self):
-        return Stack(self.back, self.front, self.length)
+        return self  # immutable
 
     def get_output(self):
+        """Card ids from back to front"""
+        if self.is_faces:
+            return [str(self.back)] * self.length
+
         out_arr = []
-        for i in self.length:
-            diff = int(self.back.value) - i
+        for i in range(self.length):
+            diff = self.value_lookup[self.back.value] - i
             suit = self.back.suit
-            if diff % 2 == 1:
+            if i % 2 == 1:
                 suit = self.suit_swap[suit]
 
-            out_arr.push(str(diff) + suit)
+            out_arr.append(str(diff % 10) + suit)
 
         return out_arr
 
     def hash(self):
         return str(self)
+
+    @staticmethod
+    def build_combine_table():
+        """Unknown cards (last index) never combine"""
+        cards = [Card(id[0], id[1]) for id in Card.IDS]
+        table = [
+            [
+                Stack.check_combine(Stack(back, back, 1), Stack(front, front, 1))
+                is not None
+                for front in cards
+            ]
+            + [False]
+            for back in cards
+        ]
+        table.append([False] * (len(cards) + 1))
+        return table
+
+
+Stack.combine_table = Stack.build_combine_table()
@@ -0,0 +1,35 @@
+import hashlib
+
+
+class Zobrist:
+    """64-bit Zobrist keys of game states.
+
+    A rank's key is the XOR of one key per (depth, stack), so pushing or
+    popping its top stack is O(1). A game's key is the sum of its rank keys,
+    independent of rank order like Game.hash(), and equal ranks don't cancel.
+    Stacks are told apart like Stack.hash(), by back and front card. Keys are
+    derived from card ids, so they are stable across runs.
+    """
+
+    MASK = (1 << 64) - 1
+    MAX_DEPTH = 36  # depth HAND is used by the hand rank
+    HAND = -1
+
+    keys: dict[tuple[str, str], list[int]] = {}
+
+    @classmethod
+    def get_keys(cls, back_id: str, front_id: str):
+        """keys of a stack at every depth, the last one is for the hand"""
+        keys = cls.keys.get((back_id, front_id))
+        if keys is None:
+            keys = []
+            for depth in range(cls.MAX_DEPTH + 1):
+                data = f"{back_id}:{front_id}@{depth}".encode()
+                digest = hashlib.blake2b(data, digest_size=8).digest()
+                keys.append(int.from_bytes(digest, "little"))
+            cls.keys[(back_id, front_id)] = keys
+        return keys
+
+    @classmethod
+    def stack_key(cls, depth: int, stack):
+        return stack.keys[depth]
@@ -0,0 +1,130 @@
+import random
+import time
+
+import pytest
+
+from Board import Board
+from Card import Card
+from Game import Game
+from Geometry import Geometry, GeometryCache
+from Predictor import Prediction
+from Session import SessionRecorder, get_ids, read_session
+from Simulator import SimulatedTable
+
+
+class HopelessPredictor:
+    def predict(self, game, with_hand=False):
+        return Prediction(Prediction.HOPELESS, {}, 0)
+
+
+def get_board(policy: str):
+    board = Board(SimulatedTable(0))
+    board.predictor = HopelessPredictor()
+    board.hopeless_policy = policy
+    board.game = Game.deal(random.Random(0))
+    return board
+
+
+def test_hopeless_skip_in_hand_mode():
+    board = get_board("skip")
+    metrics = board.metrics.begin()
+    solver, _, moves = board.solve_game(True, metrics)
+    assert moves is None and solver.nodes == 0
+    assert metrics.predicted == Prediction.HOPELESS
+
+
+def test_hopeless_hand_in_hand_mode():
+    board = get_board("hand")
+    solver, _, moves = board.solve_game(True, board.metrics.begin())
+    assert moves is not None and solver.check_hand
+
+
+def test_hopeless_hand_in_quick_mode():
+    board = get_board("hand")
+    solver, _, moves = board.solve_game(False, board.metrics.begin())
+    assert moves is not None and solver.check_hand
+
+
+class FakeClock:
+    """time.perf_counter that only moves when advanced"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def play_made_game(stages: bool, clock: FakeClock):
+    """recognition of one quick game made in 0.05s capture and 0.1s work"""
+    table = SimulatedTable(0)
+    board = Board(table)
+
+    def make_game():
+        game_metrics = board.metrics.current
+        with game_metrics.stage("capture"):
+            clock.advance(0.05)
+        if stages:
+            with game_metrics.stage("recognition"):
+                clock.advance(0.1)
+        else:
+            clock.advance(0.1)
+        ranks = get_ids(table.game)
+        return Game.from_cards([[Card(id[0], id[1]) for id in r] for r in ranks])
+
+    board.play_quick_games(1, make_game, None)
+    return board.metrics.games[0].recognition
+
+
+def test_recognition_counted_once(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "perf_counter", clock)
+    for stages in [True, False]:
+        assert play_made_game(stages, clock) == pytest.approx(0.1)
+
+
+def test_recorded_mode_is_the_solved_one(tmp_path):
+    table = SimulatedTable(0)
+    board = Board(table)
+    board.predictor = HopelessPredictor()
+    board.recorder = SessionRecorder(str(tmp_path / "s.session"))
+    board.play_quick_games(1, None, None)
+    board.recorder.close()
+
+    results = [h for h, _ in read_session(board.recorder.path) if h["type"] == "result"]
+    assert results[0]["metrics"]["hand"] is True
+
+
+def test_anytime_plays_probe_moves_while_solving():
+    board = Board(SimulatedTable(0))
+    board.anytime = True
+    board.play_quick_games(1, None, None)
+    assert board.metrics.games[0].solved
+    assert board.metrics.games[0].prefix >= Game.plan_moves
+
+
+DEFAULT_GEOMETRY = Geometry((366, 460, 1556, 730), (118, 180), (1430, 245), (1400, 900))
+
+
+def test_geometry_of_the_defaults_keeps_the_boxes():
+    boxes = Board(SimulatedTable(0)).bounding_box_list
+    board = Board(SimulatedTable(0))
+    board.apply_geometry(DEFAULT_GEOMETRY, (1920, 1080))
+    assert board.bounding_box_list == boxes
+
+    board.apply_geometry(DEFAULT_GEOMETRY, (3840, 2160))
+    assert board.bounding_box_list[1][2] == tuple(2 * v for v in boxes[1][2])
+
+
+def test_first_game_uses_the_cached_geometry(tmp_path):
+    table = SimulatedTable(0)
+    board = Board(table)
+    board.geometry_cache = GeometryCache(str(tmp_path / "geometry.json"))
+    board.geometry_cache.put((1920, 1080), DEFAULT_GEOMETRY)
+
+    game = board.make_game()
+    assert board.geometry_cache is None
+    assert get_ids(game) == get_ids(table.game)
@@ -0,0 +1,70 @@
+import random
+
+from Budget import SolveBudget
+from Card import Card
+from Game import Game
+from Predictor import Predictor
+
+
+def get_pairs(table):
+    return sorted(
+        (move.from_rank_id, move.dest_rank_id)
+        for row in table
+        for move in row
+        if move is not None
+    )
+
+
+def test_move_table_after_face_merge():
+    """FC onto FC keeps the rank key, the FC:FC stack must not go into the hand"""
+    six_red, six_black, clubs = Card("6", "R"), Card("6", "B"), Card("F", "C")
+    game = Game.from_cards([[six_red, clubs], [six_black, clubs]])
+    game.get_move_table()
+    game.make_move(game.get_move(0, 1))
+
+    table = game.get_move_table()
+    assert get_pairs(table) == get_pairs(game.make_copy().get_move_table())
+    assert table[1][-1] is None
+
+
+def test_failed_stage_goes_on_with_the_first():
+    """seed 1 deal 0 dead-ends in a later stage, solve_by_goals then costs
+    about what solve does instead of its stages and a whole solve"""
+    game = Game.deal(random.Random(1))
+    plain = game.make_copy()
+    assert plain.solve(True) is not None
+
+    staged = game.make_copy()
+    moves = staged.solve_by_goals(True, SolveBudget(nodes=plain.nodes + 100))
+    assert moves is not None
+    for move in moves:
+        game.make_move(move)
+    assert game.is_victory()
+
+
+def get_pairs_of(moves):
+    return [(move.from_rank_id, move.dest_rank_id) for move in moves]
+
+
+def test_anytime_commits_plan_before_searching():
+    game = Game.deal(random.Random(0))
+    plan = Predictor().predict(game, True).moves
+    solver = game.make_copy()
+    handed = []
+    moves = solver.solve(True, None, lambda p: handed.append((p, solver.nodes)), plan)
+
+    prefix, nodes = handed[0]
+    assert nodes == 0 and get_pairs_of(prefix) == get_pairs_of(plan[:8])
+    assert moves is not None and moves[:8] == prefix
+    for move in moves:
+        game.make_move(move)
+    assert game.is_victory()
+
+
+def test_anytime_out_of_budget_returns_plan():
+    game = Game.deal(random.Random(0))
+    plan = Predictor().predict(game, True).moves
+    solver = game.make_copy()
+    moves = solver.solve(True, SolveBudget(nodes=64), lambda p: None, plan)
+    assert solver.aborted == SolveBudget.NODES
+    assert get_pairs_of(moves) == get_pairs_of(plan)